@@ -0,0 +1,152 @@
+import time
+import numpy as np
+from statistics import NormalDist
+from modules.moments import chunk_summary, merge_summaries, summary_statistics
+from modules.sampling import make_generator, seed_sequence
+
+ADAPTIVE_STATISTICS = ('mean', 'premium', 'var')
+
+
+def _confidence_interval(statistic, summary, values, confidence, level, loading_factor):
+    """
+    Point estimate and confidence interval half-width of the chosen statistic
+
+    'mean' and 'premium' use the normal approximation on the merged moments. 'var' uses
+    the distribution-free order-statistic interval around the level quantile.
+    """
+    z_score = NormalDist().inv_cdf(0.5 + confidence / 2)
+    moments = summary_statistics(summary)
+
+    if statistic == 'mean':
+        return moments['mean'], z_score * moments['standard_error']
+
+    if statistic == 'premium':
+        return moments['mean'] * loading_factor, z_score * moments['standard_error'] * loading_factor
+
+    # The number of samples below the true quantile is Binomial(n, level)
+    n = len(values)
+    spread = z_score * np.sqrt(n * level * (1 - level))
+    lower = int(np.clip(np.floor(n * level - spread), 0, n - 1))
+    upper = int(np.clip(np.ceil(n * level + spread), 0, n - 1))
+    ordered = np.partition(values, [lower, upper])
+
+    return np.quantile(values, level), (ordered[upper] - ordered[lower]) / 2
+
+
+def adaptive_simulation(kernel, statistic='mean', tolerance=0.01, relative=True, confidence=0.95, level=0.995,
+                        expense_ratio=0.25, risk_margin_ratio=0.05, initial_samples=1000, growth_factor=2.0,
+                        max_samples=10000000, time_budget=None, seed=42, **kernel_args):
+    """
+    Simulates in growing batches until the confidence interval of a statistic is narrow enough
+
+    Each batch draws from its own child seed, so a run is reproducible for a given seed
+    whatever the tolerance stops it at (a looser tolerance just stops earlier on the same
+    sequence of batches). With a time budget, the next batch is shrunk to what the measured
+    time per sample leaves room for, so the last batch can depend on machine speed.
+
+    Parameters:
+    -----------
+    kernel : callable
+        Chunk kernel from modules.parallel, called as kernel(rng, num_samples, **kernel_args)
+    statistic : str
+        'mean' (expected loss), 'premium' (expected loss grossed up for expenses and risk
+        margin) or 'var' (value at risk at the given level)
+    tolerance : float
+        Target confidence interval half-width
+    relative : bool
+        If True, tolerance is a share of the estimate (0.01 = +/-1%), otherwise in dollars
+    confidence : float
+        Confidence of the interval (0.95 = 95%)
+    level : float
+        Quantile level for statistic='var'
+    expense_ratio : float
+        Expense ratio for statistic='premium'
+    risk_margin_ratio : float
+        Risk margin ratio for statistic='premium'
+    initial_samples : int
+        Size of the first batch
+    growth_factor : float
+        Each batch grows the total sample by this factor
+    max_samples : int
+        Upper limit on simulated samples
+    time_budget : float
+        Seconds the run may take (None for no limit). Batches are sized from the measured
+        time per sample so the run stays within it
+    seed : int or numpy.random.SeedSequence
+        Random seed for reproducibility
+    **kernel_args :
+        Parameters passed to the kernel (e.g. accident_probability, num_policyholders)
+
+    Returns:
+    --------
+    stats : dict
+        Estimate, confidence interval, achieved precision, samples used and why it stopped
+    """
+    if statistic not in ADAPTIVE_STATISTICS:
+        raise ValueError(f"statistic must be one of {ADAPTIVE_STATISTICS}, got {statistic!r}")
+    if growth_factor <= 1:
+        raise ValueError(f"growth_factor must be above 1, got {growth_factor}")
+    if initial_samples < 1:
+        raise ValueError(f"initial_samples must be at least 1, got {initial_samples}")
+
+    start = time.perf_counter()
+    parent = seed_sequence(seed)
+    loading_factor = 1 / (1 - expense_ratio - risk_margin_ratio)
+
+    summary = chunk_summary([])
+    batches = []
+    num_batches = 0
+    batch_size = int(initial_samples)
+
+    while True:
+        batch_start = time.perf_counter()
+        rng = make_generator(parent.spawn(1)[0])
+        values = kernel(rng, batch_size, **kernel_args)
+        summary = merge_summaries(summary, chunk_summary(values))
+        num_batches += 1
+
+        # Only the quantile interval needs the samples themselves
+        if statistic == 'var':
+            batches.append(values)
+            values = np.concatenate(batches)
+            batches = [values]
+
+        estimate, half_width = _confidence_interval(statistic, summary, values, confidence, level,
+                                                    loading_factor)
+        target = tolerance * abs(estimate) if relative else tolerance
+        now = time.perf_counter()
+        elapsed = now - start
+
+        seconds_per_sample = (now - batch_start) / batch_size
+        batch_size = int(min(max(summary['count'] * (growth_factor - 1), 1), max_samples - summary['count']))
+        if time_budget is not None:
+            # Shrink the next batch to what the remaining time allows at the last batch's pace
+            batch_size = min(batch_size, int((time_budget - elapsed) / max(seconds_per_sample, 1e-12)))
+
+        if half_width <= target:
+            stop_reason = 'tolerance'
+        elif summary['count'] >= max_samples:
+            stop_reason = 'max_samples'
+        elif batch_size < 1:
+            stop_reason = 'time_budget'
+        else:
+            continue
+        break
+
+    stats = {
+        'estimate': estimate,
+        'half_width': half_width,
+        'ci_lower': estimate - half_width,
+        'ci_upper': estimate + half_width,
+        'relative_half_width': half_width / abs(estimate) if estimate else np.inf,
+        'target_met': stop_reason == 'tolerance',
+        'stop_reason': stop_reason,
+        'samples_used': summary['count'],
+        'num_batches': num_batches,
+        'seconds': elapsed,
+        'statistic': statistic,
+        'confidence': confidence,
+        'seed': seed
+    }
+
+    return stats
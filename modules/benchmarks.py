@@ -0,0 +1,430 @@
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from statistics import NormalDist
+from modules.glm import simulate_rating_portfolio, one_hot_design, fit_rating_glms
+from modules.premium_calculation import rate_policies
+from modules.rating_tables import make_rating_tables, compile_rating_tables, quote_policies
+from modules.parallel import run_parallel_simulation, driver_losses
+from modules.sampling import make_generator, normal_draws, uniform_draws
+from modules.tail_risk import estimate_tail_risk
+
+
+def benchmark_parallel_scaling(num_samples=20000000, chunk_size=250000, worker_counts=None, seed=42,
+                               repeats=1):
+    """
+    Measures how the parallel Monte Carlo runner scales with the number of worker processes
+
+    Every worker count must reproduce the single-worker result exactly.
+
+    Parameters:
+    -----------
+    num_samples : int
+        Number of drivers simulated per run
+    chunk_size : int
+        Drivers per chunk (more chunks than workers keeps all cores busy)
+    worker_counts : list
+        Worker counts to time. Defaults to 1, 2, 4, ... up to the CPU count
+    seed : int
+        Random seed shared by all runs
+    repeats : int
+        Timed runs per worker count (the fastest is kept)
+
+    Returns:
+    --------
+    results : dict
+        Seconds, speedup and parallel efficiency per worker count
+    """
+    if worker_counts is None:
+        cpu_count = os.cpu_count() or 1
+        worker_counts = sorted({min(2 ** i, cpu_count) for i in range(cpu_count.bit_length() + 1)})
+
+    kernel_args = {'frequency': 0.15, 'severity_mu': np.log(16000) - 0.18, 'severity_sigma': 0.6}
+
+    timings = {}
+    reference = None
+    for workers in worker_counts:
+        best = np.inf
+        for _ in range(repeats):
+            start = time.perf_counter()
+            stats = run_parallel_simulation(driver_losses, num_samples, chunk_size, seed=seed,
+                                            max_workers=workers, **kernel_args)
+            best = min(best, time.perf_counter() - start)
+
+        if reference is None:
+            reference = stats
+        elif stats['mean'] != reference['mean'] or stats['variance'] != reference['variance']:
+            raise AssertionError(f"Result with {workers} workers differs from {worker_counts[0]} worker(s)")
+
+        timings[workers] = best
+
+    base = timings[worker_counts[0]] * worker_counts[0]
+    results = {
+        'seconds': timings,
+        'speedup': {w: base / t for w, t in timings.items()},
+        'efficiency': {w: base / t / w for w, t in timings.items()},
+        'mean': reference['mean'],
+        'num_samples': num_samples
+    }
+
+    print("\nParallel Monte Carlo scaling:")
+    for workers in worker_counts:
+        print(f"• {workers:>3} workers: {timings[workers]:.2f}s, "
+              f"speedup {results['speedup'][workers]:.1f}x, efficiency {results['efficiency'][workers]:.0%}")
+
+    return results
+
+
+def benchmark_tail_estimators(accident_probability=0.05, num_policyholders=10000, levels=(0.995, 0.999),
+                              severity_mu=None, severity_sigma=None, num_samples=100000, seed=42):
+    """
+    Compares importance sampling + antithetic draws with plain Monte Carlo for tail risk
+
+    Both estimators use the same number of samples. The squared ratio of their standard
+    errors is the factor by which plain Monte Carlo needs more samples for the same precision.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident
+    num_policyholders : int
+        The number of policyholders
+    levels : tuple
+        Confidence levels (0.995 = 99.5%)
+    severity_mu : float
+        Lognormal location of a claim amount. None uses the fixed claim amount
+    severity_sigma : float
+        Lognormal shape of a claim amount
+    num_samples : int
+        Samples per estimator
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    results : dict
+        Standard errors of both estimators and the sample-size saving per level and measure
+    """
+    common = dict(accident_probability=accident_probability, num_policyholders=num_policyholders,
+                  levels=levels, severity_mu=severity_mu, severity_sigma=severity_sigma,
+                  num_samples=num_samples, seed=seed)
+
+    timings = {}
+    estimates = {}
+    for name, method, antithetic in (('variance_reduced', 'importance', True), ('plain', 'plain', False)):
+        start = time.perf_counter()
+        estimates[name] = estimate_tail_risk(method=method, antithetic=antithetic, **common)
+        timings[name] = time.perf_counter() - start
+
+    savings = {}
+    print("\nTail risk estimators (same number of samples):")
+    for level in levels:
+        for measure in ('var', 'tvar'):
+            plain_se = estimates['plain'][f'{measure}_se'][level]
+            reduced_se = estimates['variance_reduced'][f'{measure}_se'][level]
+            if plain_se == 0 or reduced_se == 0:
+                # Lattice losses (fixed claim amount): a zero batch SE is not a precision estimate
+                savings[(measure, level)] = np.nan
+                print(f"• {measure.upper()} {level:.1%}: batch SE degenerate (lattice losses), no comparison")
+                continue
+            savings[(measure, level)] = (plain_se / reduced_se) ** 2
+            print(f"• {measure.upper()} {level:.1%}: plain SE {plain_se:,.0f}, "
+                  f"variance-reduced SE {reduced_se:,.0f} -> {savings[(measure, level)]:.0f}x fewer samples")
+
+    results = {
+        'plain': estimates['plain'],
+        'variance_reduced': estimates['variance_reduced'],
+        'sample_size_saving': savings,
+        'seconds': timings
+    }
+
+    return results
+
+
+def benchmark_sampling_convergence(accident_probability=0.05, base_frequency=0.05, base_severity=8000,
+                                   severity_sigma=0.4, sizes=None, repeats=50, seed=42):
+    """
+    Compares the convergence of pseudo-random and scrambled Sobol sampling
+
+    Two estimates with known exact answers are repeated with independent seeds:
+    the risk pool's claim rate over n simulated policyholder-years and the driver
+    cohort's expected loss per driver (frequency x severity, with the 0.1% frequency
+    floor used in the driver comparison). Sobol sampling only pays off for such
+    averages over many points; the risk pool demo simulates a single year whose claim
+    count must stay random, so it has no Sobol mode.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident in the risk pool
+    base_frequency : float
+        Mean driver frequency
+    base_severity : float
+        Mean claim severity
+    severity_sigma : float
+        Lognormal shape of the severity
+    sizes : list
+        Sample sizes to compare. Defaults to powers of two from 64 to 65,536
+    repeats : int
+        Independent repetitions per size (for the root mean squared error)
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    results : dict
+        Root mean squared error per sampling method, problem and size
+    """
+    if sizes is None:
+        sizes = [2 ** k for k in range(6, 17, 2)]
+
+    # Exact answers: E[max(F, 0.001)] for normal F, times the lognormal mean
+    sd = 0.3 * base_frequency
+    a = (0.001 - base_frequency) / sd
+    normal = NormalDist()
+    exact_frequency = (0.001 * normal.cdf(a) + base_frequency * (1 - normal.cdf(a))
+                       + sd * normal.pdf(a))
+    exact_loss = exact_frequency * base_severity
+    severity_mu = np.log(base_severity) - 0.5 * severity_sigma ** 2
+
+    children = np.random.SeedSequence(seed).spawn(repeats)
+    results = {}
+    for sampling in ('pseudo', 'sobol'):
+        pool_errors = np.zeros((repeats, len(sizes)))
+        loss_errors = np.zeros((repeats, len(sizes)))
+        for r, child in enumerate(children):
+            rng = make_generator(child)
+            for i, n in enumerate(sizes):
+                claim_rate = np.mean(uniform_draws(rng, n, 1, sampling)[:, 0] < accident_probability)
+                pool_errors[r, i] = claim_rate - accident_probability
+
+                z = normal_draws(rng, n, 2, sampling)
+                frequencies = np.maximum(base_frequency + sd * z[:, 0], 0.001)
+                severities = np.exp(severity_mu + severity_sigma * z[:, 1])
+                loss_errors[r, i] = np.mean(frequencies * severities) - exact_loss
+
+        results[sampling] = {
+            'risk_pool_rmse': np.sqrt(np.mean(pool_errors ** 2, axis=0)),
+            'driver_loss_rmse': np.sqrt(np.mean(loss_errors ** 2, axis=0))
+        }
+
+    results['sizes'] = sizes
+
+    print("\nSampling convergence (RMSE, pseudo vs Sobol):")
+    for i, n in enumerate(sizes):
+        print(f"• n={n:>6,}: pool rate {results['pseudo']['risk_pool_rmse'][i]:.2e} vs "
+              f"{results['sobol']['risk_pool_rmse'][i]:.2e}, driver loss "
+              f"${results['pseudo']['driver_loss_rmse'][i]:,.2f} vs ${results['sobol']['driver_loss_rmse'][i]:,.2f}")
+
+    return results
+
+
+def benchmark_import_time(modules=('app', 'scipy.stats'), repeats=5):
+    """
+    Measures cold-start import time of the app in fresh interpreter processes
+
+    Each import runs in a new Python process (nothing cached in sys.modules), from the
+    project root. Importing scipy.stats on its own shows what keeping it off the app's
+    import path saves at every worker start.
+
+    Parameters:
+    -----------
+    modules : tuple
+        Modules to import, one fresh process per import
+    repeats : int
+        Processes per module (the fastest is kept)
+
+    Returns:
+    --------
+    results : dict
+        Seconds per module and whether importing the app loaded scipy.stats
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = ("import sys, time; start = time.perf_counter(); import {module}; "
+              "print(time.perf_counter() - start, 'scipy.stats' in sys.modules)")
+
+    timings = {}
+    loads_scipy_stats = {}
+    for module in modules:
+        best = np.inf
+        for _ in range(repeats):
+            output = subprocess.run([sys.executable, '-c', script.format(module=module)], cwd=project_root,
+                                    capture_output=True, text=True, check=True).stdout.split()
+            best = min(best, float(output[0]))
+        timings[module] = best
+        loads_scipy_stats[module] = output[1] == 'True'
+
+    results = {'seconds': timings, 'loads_scipy_stats': loads_scipy_stats}
+
+    print("\nCold-start import time:")
+    for module in modules:
+        print(f"• import {module}: {timings[module] * 1000:,.0f} ms"
+              f"{' (loads scipy.stats)' if loads_scipy_stats[module] else ''}")
+
+    return results
+
+
+def benchmark_glm_fit(num_policies=5000000, dense_policies=1000000, seed=42):
+    """
+    Times the sparse frequency + severity GLM fit and compares it with a naive dense fit
+
+    The naive fit builds the full dense design matrix (rows x columns floats) and forms
+    X' W X in one product. The comparison runs on the first dense_policies rows; the sparse
+    fit is then also timed on the full portfolio.
+
+    Parameters:
+    -----------
+    num_policies : int
+        Policy rows for the full-size sparse fit
+    dense_policies : int
+        Policy rows for the sparse vs dense comparison
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    results : dict
+        Seconds per fit, the sparse speedup, design matrix memory and the largest relativity
+        difference between fits
+    """
+    portfolio = simulate_rating_portfolio(num_policies, seed=seed)
+    subset = {
+        'codes': {name: codes[:dense_policies] for name, codes in portfolio['codes'].items()},
+        'num_levels': portfolio['num_levels'],
+        'exposure': portfolio['exposure'][:dense_policies],
+        'claim_counts': portfolio['claim_counts'][:dense_policies],
+        'average_claim': portfolio['average_claim'][:dense_policies]
+    }
+
+    timings = {}
+    fits = {}
+    for name, data, dense in (('sparse', subset, False), ('dense', subset, True), ('sparse_full', portfolio, False)):
+        # The naive fit forms X' W X in one pass over the whole dense matrix
+        chunk_size = dense_policies if dense else 50000
+        start = time.perf_counter()
+        fits[name] = fit_rating_glms(data, dense=dense, chunk_size=chunk_size)
+        timings[name] = time.perf_counter() - start
+
+    X_sparse, _ = one_hot_design(subset['codes'], subset['num_levels'])
+    memory = {'sparse': X_sparse.data.nbytes + X_sparse.indices.nbytes + X_sparse.indptr.nbytes,
+              'dense': X_sparse.shape[0] * X_sparse.shape[1] * 8}
+
+    max_difference = max(np.max(np.abs(fits['sparse'][model]['relativities'] - fits['dense'][model]['relativities']))
+                         for model in ('frequency', 'severity'))
+
+    results = {
+        'seconds': timings,
+        'speedup': timings['dense'] / timings['sparse'],
+        'design_bytes': memory,
+        'max_relativity_difference': max_difference,
+        'fits': fits['sparse_full']
+    }
+
+    print("\nGLM fit (Poisson frequency + Gamma severity):")
+    print(f"• {dense_policies:,} policies: sparse {timings['sparse']:.1f}s, dense {timings['dense']:.1f}s "
+          f"-> {results['speedup']:.1f}x (max relativity difference {max_difference:.1e})")
+    print(f"• Design matrix: sparse {memory['sparse'] / 1e6:,.0f} MB, dense {memory['dense'] / 1e6:,.0f} MB")
+    print(f"• {num_policies:,} policies: sparse {timings['sparse_full']:.1f}s")
+
+    return results
+
+
+def benchmark_batch_rating(num_policies=10000000, loop_policies=100000, seed=42):
+    """
+    Times rate_policies() on a large portfolio against pricing policies one at a time
+
+    Parameters:
+    -----------
+    num_policies : int
+        Policies priced in one vectorized call
+    loop_policies : int
+        Policies priced in a Python loop with the scalar premium formula
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    results : dict
+        Policies per second for the loop and the batch call, and the speedup
+    """
+    rng = make_generator(seed)
+    frequency = rng.uniform(0.01, 0.5, num_policies)
+    severity = rng.uniform(1000, 50000, num_policies)
+    expense_ratio = rng.uniform(0.15, 0.3, num_policies)
+
+    start = time.perf_counter()
+    for i in range(loop_policies):
+        premium = frequency[i] * severity[i] / (1 - expense_ratio[i] - 0.05)
+    loop_rate = loop_policies / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    components = rate_policies(frequency, severity, expense_ratio)
+    batch_rate = num_policies / (time.perf_counter() - start)
+
+    results = {
+        'loop_policies_per_second': loop_rate,
+        'batch_policies_per_second': batch_rate,
+        'speedup': batch_rate / loop_rate,
+        'mean_premium': components['premium'].mean()
+    }
+
+    print("\nBatch rating (premium components per policy):")
+    print(f"• Python loop: {loop_rate:,.0f} policies/s")
+    print(f"• rate_policies on {num_policies:,} policies: {batch_rate:,.0f} policies/s "
+          f"-> {results['speedup']:.0f}x")
+
+    return results
+
+
+def benchmark_rating_quotes(num_policies=1000000, loop_policies=100000, repeats=5, seed=42):
+    """
+    Quotes per second of the compiled rating tables against a per-policy table lookup loop
+
+    Parameters:
+    -----------
+    num_policies : int
+        Policies quoted per quote_policies() call
+    loop_policies : int
+        Policies quoted one at a time from the factor tables
+    repeats : int
+        quote_policies() calls to time (the best is reported)
+    seed : int
+        Random seed
+
+    Returns:
+    --------
+    results : dict
+        Quotes per second for the loop and for quote_policies() in float64 and float32
+    """
+    codes = simulate_rating_portfolio(num_policies, seed=seed)['codes']
+    tables = make_rating_tables()
+
+    start = time.perf_counter()
+    for i in range(loop_policies):
+        premium = tables['base_rate']
+        for name in tables['variables']:
+            premium *= tables['factors'][name][codes[name][i]]
+    loop_rate = loop_policies / (time.perf_counter() - start)
+
+    results = {'loop_quotes_per_second': loop_rate}
+    print("\nRating table quotes:")
+    print(f"• Per-policy loop: {loop_rate:,.0f} quotes/s")
+
+    for dtype in (np.float64, np.float32):
+        compiled = compile_rating_tables(tables, dtype)
+        quotes = np.empty(num_policies, dtype=dtype)
+        seconds = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            quote_policies(compiled, codes, out=quotes)
+            seconds.append(time.perf_counter() - start)
+
+        rate = num_policies / min(seconds)
+        results[f'{np.dtype(dtype).name}_quotes_per_second'] = rate
+        print(f"• quote_policies ({np.dtype(dtype).name}, {num_policies:,} policies): {rate:,.0f} quotes/s "
+              f"-> {rate / loop_rate:,.0f}x")
+
+    return results
+
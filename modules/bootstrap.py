@@ -0,0 +1,191 @@
+import numpy as np
+from modules.moments import safe_ratio
+from modules.sampling import make_generator
+
+BOOTSTRAP_METHODS = ('auto', 'multinomial', 'poisson')
+
+# Poisson(1) CDF at 0..8 on the uint32 scale; weights above 9 (probability about 1e-7) are capped
+_POISSON_THRESHOLDS = np.round(np.cumsum(np.exp(-1) / np.cumprod(np.r_[1, np.arange(1, 9)]))
+                               * 2 ** 32).astype(np.uint32)
+
+
+def _poisson_weights(rng, shape):
+    """
+    Poisson(1) bootstrap weights by inverse CDF on random 32-bit integers (2-3x faster
+    than Generator.poisson for this fixed mean)
+    """
+    draws = rng.integers(0, 2 ** 32, size=shape, dtype=np.uint32)
+    weights = np.zeros(shape, dtype=np.uint8)
+    for threshold in _POISSON_THRESHOLDS:
+        weights += draws >= threshold
+    return weights
+
+
+def bootstrap_means(values, num_replicates=2000, method='auto', max_elements=2000000, rng=None):
+    """
+    Bootstrap replicates of the column means of a (drivers x variables) array
+
+    'multinomial' resamples driver indices with replacement (one replicates x drivers
+    index matrix per chunk). 'poisson' gives every driver a Poisson(1) weight per replicate
+    and turns the weighted means into one matrix product, which suits large cohorts.
+    Replicates are processed in chunks of at most max_elements draws, so peak memory is
+    a few tens of bytes per element (about 50 MB at the default).
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Array of shape (drivers,) or (drivers, variables)
+    num_replicates : int
+        Number of bootstrap replicates
+    method : str
+        'multinomial', 'poisson' or 'auto' (Poisson above 100,000 drivers)
+    max_elements : int
+        Upper limit on the size of one chunk of indices or weights
+    rng : numpy.random.Generator
+        Random stream
+
+    Returns:
+    --------
+    numpy.ndarray
+        Replicate means of shape (num_replicates, variables)
+    """
+    if method not in BOOTSTRAP_METHODS:
+        raise ValueError(f"method must be one of {BOOTSTRAP_METHODS}, got {method!r}")
+
+    rng = make_generator(rng)
+    values = np.asarray(values, dtype=float).reshape(len(values), -1)
+    num_drivers = len(values)
+
+    if method == 'auto':
+        method = 'poisson' if num_drivers > 100000 else 'multinomial'
+
+    chunk = max(int(max_elements // num_drivers), 1)
+    index_dtype = np.int32 if num_drivers <= np.iinfo(np.int32).max else np.int64
+    replicates = np.empty((num_replicates, values.shape[1]))
+
+    for start in range(0, num_replicates, chunk):
+        size = min(chunk, num_replicates - start)
+        if method == 'multinomial':
+            indices = rng.integers(0, num_drivers, size=(size, num_drivers), dtype=index_dtype)
+            replicates[start:start + size] = values[indices].mean(axis=1)
+        else:
+            # Only the weights of one chunk are widened to float for the matrix product
+            weights = _poisson_weights(rng, (size, num_drivers))
+            totals = weights.sum(axis=1, dtype=np.int64)[:, None]
+            replicates[start:start + size] = (weights.astype(float) @ values) / totals
+
+    return replicates
+
+
+def driver_comparison_statistics(good_means, bad_means, num_good, num_bad, claim_level=False):
+    """
+    The driver comparison stats from cohort mean frequencies and severities
+
+    Works on scalars or on arrays of bootstrap replicates alike. Multipliers are NaN
+    where the first cohort's value is zero.
+
+    Parameters:
+    -----------
+    good_means, bad_means : numpy.ndarray
+        Mean frequency (column 0) and mean severity (column 1) of each cohort, or with
+        claim_level, mean claim count (column 0) and mean simulated loss (column 1) per driver
+    num_good, num_bad : int
+        Number of drivers in each cohort
+    claim_level : bool
+        If True, frequency is claims per driver, severity is losses per claim and total
+        losses are the simulated losses
+
+    Returns:
+    --------
+    stats : dict
+        The numeric statistics of demonstrate_driver_comparison's stats dict
+    """
+    good_frequency, bad_frequency = good_means[..., 0], bad_means[..., 0]
+    if claim_level:
+        good_losses, bad_losses = good_means[..., 1] * num_good, bad_means[..., 1] * num_bad
+        good_severity = safe_ratio(good_means[..., 1], good_frequency)
+        bad_severity = safe_ratio(bad_means[..., 1], bad_frequency)
+    else:
+        good_severity, bad_severity = good_means[..., 1], bad_means[..., 1]
+        good_losses = good_frequency * good_severity * num_good
+        bad_losses = bad_frequency * bad_severity * num_bad
+
+    stats = {
+        'good_avg_frequency': good_frequency,
+        'bad_avg_frequency': bad_frequency,
+        'good_avg_severity': good_severity,
+        'bad_avg_severity': bad_severity,
+        'good_total_losses': good_losses,
+        'bad_total_losses': bad_losses,
+        'loss_multiplier': safe_ratio(bad_losses, good_losses),
+        'freq_multiplier': safe_ratio(bad_frequency, good_frequency),
+        'severity_multiplier': safe_ratio(bad_severity, good_severity)
+    }
+
+    return stats
+
+
+def bootstrap_driver_comparison(good_frequencies, good_severities, bad_frequencies, bad_severities,
+                                num_replicates=2000, confidence=0.95, method='auto', max_elements=2000000,
+                                seed=42, claim_level=False):
+    """
+    Percentile bootstrap confidence intervals for every driver comparison statistic
+
+    Drivers are resampled within their cohort, keeping each driver's two values together.
+
+    Parameters:
+    -----------
+    good_frequencies, good_severities : numpy.ndarray
+        Per-driver frequencies and severities of the first cohort, or with claim_level,
+        per-driver claim counts and simulated losses
+    bad_frequencies, bad_severities : numpy.ndarray
+        The same for the second cohort
+    num_replicates : int
+        Number of bootstrap replicates
+    confidence : float
+        Confidence level of the intervals (0.95 = 95%)
+    method : str
+        'multinomial', 'poisson' or 'auto', see bootstrap_means()
+    max_elements : int
+        Upper limit on the size of one chunk of replicates
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    claim_level : bool
+        Whether the inputs are claim counts and losses, see driver_comparison_statistics()
+
+    Returns:
+    --------
+    intervals : dict
+        For each statistic: 'estimate', 'lower', 'upper', 'std_error' and 'undefined_share'
+        (share of replicates where a statistic is undefined because the first cohort had
+        zero losses, frequency or severity; the interval uses the remaining replicates)
+    """
+    rng = make_generator(seed)
+    good = np.column_stack([good_frequencies, good_severities])
+    bad = np.column_stack([bad_frequencies, bad_severities])
+
+    estimates = driver_comparison_statistics(good.mean(axis=0), bad.mean(axis=0), len(good), len(bad),
+                                             claim_level)
+    replicates = driver_comparison_statistics(
+        bootstrap_means(good, num_replicates, method, max_elements, rng),
+        bootstrap_means(bad, num_replicates, method, max_elements, rng),
+        len(good), len(bad), claim_level)
+
+    tail = (1 - confidence) / 2
+    intervals = {}
+    for name, values in replicates.items():
+        defined = values[np.isfinite(values)]
+        if len(defined) > 1:
+            lower, upper = np.quantile(defined, [tail, 1 - tail])
+            std_error = defined.std(ddof=1)
+        else:
+            lower = upper = std_error = np.nan
+        intervals[name] = {
+            'estimate': float(estimates[name]),
+            'lower': lower,
+            'upper': upper,
+            'std_error': std_error,
+            'undefined_share': 1 - len(defined) / len(values)
+        }
+
+    return intervals
@@ -0,0 +1,84 @@
+import numpy as np
+
+
+def simulate_claims(rng, driver_frequencies, severity_mu, severity_sigma):
+    """
+    Draws every individual claim of a portfolio of drivers
+
+    Claims are stored flat: the claims of driver i are
+    claim_amounts[claim_offsets[i]:claim_offsets[i + 1]].
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream
+    driver_frequencies : numpy.ndarray
+        Expected number of claims per year for each driver
+    severity_mu : float or numpy.ndarray
+        Lognormal location of a claim amount (scalar or one value per driver)
+    severity_sigma : float or numpy.ndarray
+        Lognormal shape of a claim amount (scalar or one value per driver)
+
+    Returns:
+    --------
+    claims : dict
+        'claim_counts' and 'driver_losses' per driver, 'claim_offsets' (length drivers + 1)
+        and the flat 'claim_amounts'
+    """
+    driver_frequencies = np.asarray(driver_frequencies, dtype=float)
+    num_drivers = len(driver_frequencies)
+
+    claim_counts = rng.poisson(driver_frequencies)
+    driver_ids = np.repeat(np.arange(num_drivers), claim_counts)
+
+    # Per-driver severity parameters are expanded to one value per claim
+    if np.ndim(severity_mu):
+        severity_mu = np.asarray(severity_mu)[driver_ids]
+    if np.ndim(severity_sigma):
+        severity_sigma = np.asarray(severity_sigma)[driver_ids]
+
+    claim_amounts = rng.lognormal(severity_mu, severity_sigma, size=len(driver_ids))
+
+    claim_offsets = np.zeros(num_drivers + 1, dtype=np.int64)
+    np.cumsum(claim_counts, out=claim_offsets[1:])
+
+    claims = {
+        'claim_counts': claim_counts,
+        'claim_offsets': claim_offsets,
+        'claim_amounts': claim_amounts,
+        'driver_losses': np.bincount(driver_ids, weights=claim_amounts, minlength=num_drivers)
+    }
+
+    return claims
+
+
+def summarize_cohort_claims(claims):
+    """
+    Actual claim statistics of one cohort from simulate_claims() output
+
+    Parameters:
+    -----------
+    claims : dict
+        Output of simulate_claims()
+
+    Returns:
+    --------
+    summary : dict
+        Drivers, claims, claim frequency, average claim amount, total losses and the share
+        of drivers with at least one claim
+    """
+    num_drivers = len(claims['claim_counts'])
+    num_claims = len(claims['claim_amounts'])
+    total_losses = claims['claim_amounts'].sum()
+
+    summary = {
+        'num_drivers': num_drivers,
+        'num_claims': num_claims,
+        'avg_frequency': num_claims / num_drivers,
+        'avg_severity': total_losses / num_claims if num_claims else 0.0,
+        'total_losses': total_losses,
+        'share_with_claim': np.count_nonzero(claims['claim_counts']) / num_drivers
+    }
+
+    return summary
+
@@ -0,0 +1,249 @@
+import numpy as np
+from modules.claim_simulation import simulate_claims, summarize_cohort_claims
+from modules.moments import safe_ratio
+from modules.sampling import make_generator, normal_draws
+
+# Claim amount spread of the driver comparison's two cohorts (the second is more variable)
+DRIVER_SEVERITY_SIGMAS = (0.4, 0.6)
+
+
+def make_cohort_table(names, frequencies, severities, severity_sigmas=0.4, num_drivers=200, frequency_cv=0.3):
+    """
+    Builds a cohort table: one array per parameter, indexed by cohort id
+
+    Scalars are broadcast to every cohort.
+
+    Parameters:
+    -----------
+    names : list
+        Cohort names
+    frequencies : array_like
+        Mean accident frequency of each cohort
+    severities : array_like
+        Mean claim amount of each cohort
+    severity_sigmas : array_like
+        Lognormal shape of the claim amount of each cohort
+    num_drivers : array_like
+        Number of drivers in each cohort
+    frequency_cv : array_like
+        Spread of driver frequencies around the cohort mean (0.3 = 30%)
+
+    Returns:
+    --------
+    table : dict
+        Arrays 'name', 'frequency', 'severity', 'severity_sigma', 'severity_mu',
+        'num_drivers', 'frequency_cv' and 'driver_offsets' (length cohorts + 1)
+    """
+    names = np.asarray(names)
+    num_cohorts = len(names)
+
+    def column(values, dtype=float):
+        return np.broadcast_to(np.asarray(values, dtype=dtype), num_cohorts).copy()
+
+    table = {
+        'name': names,
+        'frequency': column(frequencies),
+        'severity': column(severities),
+        'severity_sigma': column(severity_sigmas),
+        'num_drivers': column(num_drivers, np.int64),
+        'frequency_cv': column(frequency_cv)
+    }
+
+    if np.any(table['num_drivers'] < 1):
+        raise ValueError("Every cohort needs at least one driver")
+
+    # Mean of the lognormal equals the cohort severity
+    table['severity_mu'] = np.log(table['severity']) - 0.5 * table['severity_sigma'] ** 2
+
+    # Drivers of cohort k are rows driver_offsets[k]:driver_offsets[k + 1] of the driver arrays
+    table['driver_offsets'] = np.concatenate([[0], np.cumsum(table['num_drivers'])])
+
+    return table
+
+
+def driver_cohort_table(base_frequency=0.05, base_severity=8000, bad_driver_freq_multiplier=3.0,
+                        bad_driver_severity_multiplier=2.0, num_drivers=200, names=('good', 'bad'),
+                        severity_sigmas=DRIVER_SEVERITY_SIGMAS):
+    """
+    The two-cohort table of the driver comparison: a base cohort and one with multiplied
+    frequency and severity
+
+    Parameters:
+    -----------
+    base_frequency, base_severity : float
+        Accident frequency and average claim amount of the first cohort
+    bad_driver_freq_multiplier, bad_driver_severity_multiplier : float
+        How much higher the second cohort's frequency and claim amount are
+    num_drivers : int or tuple
+        Drivers in each cohort
+    names : tuple
+        Names of the two cohorts
+    severity_sigmas : tuple
+        Lognormal shape of each cohort's claim amounts
+
+    Returns:
+    --------
+    table : dict
+        See make_cohort_table()
+    """
+    return make_cohort_table(list(names),
+                             [base_frequency, base_frequency * bad_driver_freq_multiplier],
+                             [base_severity, base_severity * bad_driver_severity_multiplier],
+                             list(severity_sigmas), num_drivers)
+
+
+def simulate_cohorts(table, seed=42, sampling='pseudo', claim_level=False):
+    """
+    Simulates the drivers of every cohort in one batched draw
+
+    Drivers are stored cohort by cohort, so per-cohort results are grouped reductions
+    (np.add.reduceat) and the cost grows with the total number of drivers, not with the
+    number of cohorts.
+
+    Parameters:
+    -----------
+    table : dict
+        Cohort table from make_cohort_table()
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    sampling : str
+        'pseudo' for pseudo-random draws or 'sobol' for scrambled Sobol points
+    claim_level : bool
+        If True, also draws every claim (see simulate_claims) and reports actual losses
+
+    Returns:
+    --------
+    results : dict
+        Per-driver arrays 'cohort_ids', 'frequencies', 'severities' (and 'driver_losses',
+        'claim_counts' if claim_level), and per-cohort arrays 'avg_frequency',
+        'avg_severity', 'total_losses' (plus 'num_claims' and 'actual_losses' if claim_level).
+        With claim_level, 'claims' holds the simulate_claims() output of all drivers
+    """
+    rng = make_generator(seed)
+    offsets = table['driver_offsets']
+    cohort_ids = np.repeat(np.arange(len(table['name'])), table['num_drivers'])
+
+    mean_frequency = table['frequency'][cohort_ids]
+    mu = table['severity_mu'][cohort_ids]
+    sigma = table['severity_sigma'][cohort_ids]
+
+    if sampling == 'pseudo':
+        frequencies = rng.normal(mean_frequency, mean_frequency * table['frequency_cv'][cohort_ids])
+        severities = rng.lognormal(mu, sigma)
+    else:
+        # Low-discrepancy normal points: column 0 drives frequency, column 1 severity
+        normals = normal_draws(rng, len(cohort_ids), 2, sampling)
+        frequencies = mean_frequency * (1 + table['frequency_cv'][cohort_ids] * normals[:, 0])
+        severities = np.exp(mu + sigma * normals[:, 1])
+
+    frequencies = np.maximum(frequencies, 0.001)  # Minimum 0.1% frequency
+
+    starts = offsets[:-1]
+    avg_frequency = np.add.reduceat(frequencies, starts) / table['num_drivers']
+    avg_severity = np.add.reduceat(severities, starts) / table['num_drivers']
+
+    results = {
+        'cohort_ids': cohort_ids,
+        'frequencies': frequencies,
+        'severities': severities,
+        'avg_frequency': avg_frequency,
+        'avg_severity': avg_severity,
+        'total_losses': avg_frequency * avg_severity * table['num_drivers']
+    }
+
+    if claim_level:
+        claims = simulate_claims(rng, frequencies, mu, sigma)
+        results['claims'] = claims
+        results['driver_losses'] = claims['driver_losses']
+        results['claim_counts'] = claims['claim_counts']
+        results['num_claims'] = np.add.reduceat(claims['claim_counts'], starts)
+        results['actual_losses'] = np.add.reduceat(claims['driver_losses'], starts)
+
+    return results
+
+
+def cohort_slice(table, results, cohort, key):
+    """
+    Per-driver values of one cohort, e.g. cohort_slice(table, results, 0, 'frequencies')
+    """
+    offsets = table['driver_offsets']
+    return results[key][offsets[cohort]:offsets[cohort + 1]]
+
+
+def cohort_claims(table, results, cohort):
+    """
+    simulate_claims()-style arrays of one cohort from claim-level simulate_cohorts() results
+    """
+    claims = results['claims']
+    first, last = table['driver_offsets'][cohort], table['driver_offsets'][cohort + 1]
+    claim_offsets = claims['claim_offsets'][first:last + 1]
+
+    return {
+        'claim_counts': claims['claim_counts'][first:last],
+        'claim_offsets': claim_offsets - claim_offsets[0],
+        'claim_amounts': claims['claim_amounts'][claim_offsets[0]:claim_offsets[-1]],
+        'driver_losses': claims['driver_losses'][first:last]
+    }
+
+
+def simulate_driver_portfolio(base_frequency=0.05, base_severity=8000, bad_driver_freq_multiplier=3.0,
+                              bad_driver_severity_multiplier=2.0, num_drivers=1000000, seed=42,
+                              return_claims=False):
+    """
+    Claim-level simulation of both driver cohorts of demonstrate_driver_comparison
+
+    Each driver gets a frequency (normal around the cohort mean, 30% spread, 0.1% floor),
+    a Poisson number of claims and a lognormal amount per claim, so total losses are
+    actual simulated losses rather than average frequency x average severity x drivers.
+
+    Parameters:
+    -----------
+    base_frequency : float
+        Base accident frequency for first cohort
+    base_severity : float
+        Base accident severity for first cohort
+    bad_driver_freq_multiplier : float
+        How much more frequently second cohort has accidents
+    bad_driver_severity_multiplier : float
+        How much more severe second cohort's accidents are
+    num_drivers : int
+        Drivers per cohort
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    return_claims : bool
+        If True, also returns the per-driver and per-claim arrays of each cohort
+
+    Returns:
+    --------
+    stats : dict
+        Summary in the shape of demonstrate_driver_comparison's stats ('good_*' / 'bad_*'
+        statistics and multipliers) plus claim counts and shares of drivers with a claim
+    claims : dict
+        {'good': ..., 'bad': ...} simulate_claims()-style arrays (if return_claims is True)
+    """
+    table = driver_cohort_table(base_frequency, base_severity, bad_driver_freq_multiplier,
+                                bad_driver_severity_multiplier, num_drivers)
+    results = simulate_cohorts(table, seed, claim_level=True)
+
+    stats = {'num_drivers': num_drivers, 'seed': seed}
+    claims = {}
+    for cohort, name in enumerate(table['name']):
+        claims[name] = cohort_claims(table, results, cohort)
+
+        summary = summarize_cohort_claims(claims[name])
+        stats[f'{name}_avg_frequency'] = summary['avg_frequency']
+        stats[f'{name}_avg_severity'] = summary['avg_severity']
+        stats[f'{name}_total_losses'] = summary['total_losses']
+        stats[f'{name}_num_claims'] = summary['num_claims']
+        stats[f'{name}_share_with_claim'] = summary['share_with_claim']
+        stats[f'{name}_severity_mu'] = table['severity_mu'][cohort]
+        stats[f'{name}_severity_sigma'] = table['severity_sigma'][cohort]
+
+    stats['loss_multiplier'] = safe_ratio(stats['bad_total_losses'], stats['good_total_losses'])
+    stats['freq_multiplier'] = safe_ratio(stats['bad_avg_frequency'], stats['good_avg_frequency'])
+    stats['severity_multiplier'] = safe_ratio(stats['bad_avg_severity'], stats['good_avg_severity'])
+
+    if return_claims:
+        return stats, claims
+
+    return stats
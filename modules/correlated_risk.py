@@ -0,0 +1,238 @@
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from scipy.special import ndtr, ndtri
+from modules.risk_pooling import CLAIM_AMOUNT
+from modules.sampling import make_generator
+
+
+DEPENDENCE_MODELS = ('independent', 'common_shock', 'gaussian', 't')
+
+
+def scenario_claim_probabilities(rng, accident_probability, num_scenarios, dependence='gaussian',
+                                 correlation=0.1, degrees_of_freedom=4, shock_probability=0.1,
+                                 shock_multiplier=3.0):
+    """
+    Draws the claim probability of every policyholder in each scenario (year)
+
+    All models are one-factor: given the common factor, policyholders are independent with
+    the returned probability. Every model keeps the average claim probability unchanged.
+
+    - 'common_shock': a bad-weather year (probability shock_probability) multiplies the claim
+      probability by shock_multiplier; normal years are slightly safer to keep the mean
+    - 'gaussian': Gaussian copula, accident if sqrt(rho) Z + sqrt(1 - rho) e_i < N^-1(p)
+    - 't': t copula, the same latent variables divided by sqrt(W), W ~ chi2(df) / df,
+      which adds joint extreme years
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream
+    accident_probability : float
+        Average probability of an accident
+    num_scenarios : int
+        Number of scenarios
+    dependence : str
+        One of 'independent', 'common_shock', 'gaussian' or 't'
+    correlation : float
+        Latent correlation rho between policyholders (copula models)
+    degrees_of_freedom : float
+        Degrees of freedom of the t copula
+    shock_probability : float
+        Probability of a bad year (common shock model)
+    shock_multiplier : float
+        Claim probability multiplier in a bad year (common shock model)
+
+    Returns:
+    --------
+    numpy.ndarray
+        Claim probability in each scenario
+    """
+    p = accident_probability
+
+    if dependence == 'independent':
+        return np.full(num_scenarios, p)
+
+    if dependence == 'common_shock':
+        if shock_probability * shock_multiplier >= 1:
+            raise ValueError("shock_probability * shock_multiplier must be below 1 to keep the mean claim rate")
+        normal_year = p * (1 - shock_probability * shock_multiplier) / (1 - shock_probability)
+        bad_year = rng.random(num_scenarios) < shock_probability
+        return np.where(bad_year, p * shock_multiplier, normal_year)
+
+    if dependence not in DEPENDENCE_MODELS:
+        raise ValueError(f"dependence must be one of {DEPENDENCE_MODELS}, got {dependence!r}")
+
+    factor = rng.standard_normal(num_scenarios)
+
+    if dependence == 'gaussian':
+        threshold = ndtri(p)
+    else:
+        # Only the t quantile needs scipy.stats
+        from scipy.stats import t as student_t
+        threshold = student_t.ppf(p, degrees_of_freedom) * np.sqrt(
+            rng.chisquare(degrees_of_freedom, num_scenarios) / degrees_of_freedom)
+
+    return ndtr((threshold - np.sqrt(correlation) * factor) / np.sqrt(1 - correlation))
+
+
+def simulate_correlated_pool(accident_probability=0.05, num_policyholders=1000000, num_scenarios=10000,
+                             dependence='gaussian', correlation=0.05, degrees_of_freedom=4,
+                             shock_probability=0.1, shock_multiplier=3.0, level=0.995, seed=42):
+    """
+    Simulates pool losses with correlated accidents and compares them with independent accidents
+
+    Conditional on each scenario's common factor the claim count is binomial, so a million
+    correlated policyholders cost one binomial draw per scenario and no n x n matrix.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        Average probability of an accident
+    num_policyholders : int
+        The number of policyholders
+    num_scenarios : int
+        Number of simulated years
+    dependence, correlation, degrees_of_freedom, shock_probability, shock_multiplier :
+        Dependence model, see scenario_claim_probabilities()
+    level : float
+        Confidence level for the capital requirement (VaR minus mean)
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+
+    Returns:
+    --------
+    stats : dict
+        Loss statistics for the correlated and the independent pool, and the share of the
+        pooling benefit that correlation takes away
+    """
+    rng = make_generator(seed)
+    n = num_policyholders
+    p = accident_probability
+
+    probabilities = scenario_claim_probabilities(rng, p, num_scenarios, dependence, correlation,
+                                                 degrees_of_freedom, shock_probability, shock_multiplier)
+    correlated_losses = rng.binomial(n, probabilities) * float(CLAIM_AMOUNT)
+    independent_losses = rng.binomial(n, p, size=num_scenarios) * float(CLAIM_AMOUNT)
+
+    # Risk per policyholder: alone, in an independent pool, in a correlated pool
+    standalone_sd = CLAIM_AMOUNT * np.sqrt(p * (1 - p))
+    independent_sd = standalone_sd / np.sqrt(n)
+    correlated_sd = correlated_losses.std(ddof=1) / n
+
+    # What remains as the pool grows without limit: the spread of the scenario claim rate
+    non_diversifiable_sd = CLAIM_AMOUNT * probabilities.std(ddof=1)
+
+    pooling_benefit_kept = (standalone_sd - correlated_sd) / (standalone_sd - independent_sd)
+
+    expected_losses = p * CLAIM_AMOUNT * n
+
+    stats = {
+        'expected_losses': expected_losses,
+        'correlated_mean': correlated_losses.mean(),
+        'independent_mean': independent_losses.mean(),
+        'correlated_sd_per_policy': correlated_sd,
+        'independent_sd_per_policy': independent_sd,
+        'standalone_sd_per_policy': standalone_sd,
+        'non_diversifiable_sd_per_policy': non_diversifiable_sd,
+        'pooling_benefit_lost': 1 - pooling_benefit_kept,
+        'correlated_capital_per_policy': (np.quantile(correlated_losses, level) - correlated_losses.mean()) / n,
+        'independent_capital_per_policy': (np.quantile(independent_losses, level) - independent_losses.mean()) / n,
+        'correlated_worst_ratio': correlated_losses.max() / expected_losses,
+        'independent_worst_ratio': independent_losses.max() / expected_losses,
+        'scenario_probabilities': probabilities,
+        'level': level,
+        'dependence': dependence,
+        'seed': seed
+    }
+
+    return stats
+
+
+def demonstrate_correlated_pooling(accident_probability=0.05, dependence='gaussian', correlation=0.05,
+                                   num_scenarios=10000, max_policyholders=1000000, seed=42, return_fig=False,
+                                   is_mobile=False, **dependence_args):
+    """
+    Plots the risk per policyholder against pool size with and without correlated accidents
+
+    Parameters:
+    -----------
+    accident_probability : float
+        Average probability of an accident
+    dependence : str
+        One of 'common_shock', 'gaussian' or 't'
+    correlation : float
+        Latent correlation between policyholders (copula models)
+    num_scenarios : int
+        Number of simulated years per pool size
+    max_policyholders : int
+        Largest pool size on the curve
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    return_fig : bool
+        If True, returns the figure and stats for Shiny integration
+    is_mobile : bool
+        Whether to use mobile-optimized visualization
+    **dependence_args :
+        Extra dependence parameters, see scenario_claim_probabilities()
+
+    Returns:
+    --------
+    fig : matplotlib.figure.Figure
+        The figure object (if return_fig is True)
+    stats : dict
+        Key statistics (if return_fig is True)
+    """
+    rng = make_generator(seed)
+    p = accident_probability
+
+    # One set of scenario claim rates, reused for every pool size
+    probabilities = scenario_claim_probabilities(rng, p, num_scenarios, dependence, correlation,
+                                                 **dependence_args)
+    pool_sizes = np.unique(np.geomspace(10, max_policyholders, 30).astype(np.int64))
+
+    # Claim counts for every (scenario, pool size) pair in one broadcast binomial draw
+    counts = rng.binomial(pool_sizes[None, :], probabilities[:, None])
+    correlated_sd = counts.std(axis=0, ddof=1) * CLAIM_AMOUNT / pool_sizes
+    independent_sd = CLAIM_AMOUNT * np.sqrt(p * (1 - p) / pool_sizes)
+    non_diversifiable_sd = CLAIM_AMOUNT * probabilities.std(ddof=1)
+
+    stats = {
+        'pool_sizes': pool_sizes,
+        'correlated_sd_per_policy': correlated_sd,
+        'independent_sd_per_policy': independent_sd,
+        'non_diversifiable_sd_per_policy': non_diversifiable_sd,
+        'dependence': dependence,
+        'seed': seed
+    }
+
+    if not return_fig:
+        print("\nCorrelated Risk Pooling:")
+        print(f"• Independent accidents: risk per policyholder keeps falling, to ${independent_sd[-1]:,.0f} "
+              f"at {pool_sizes[-1]:,} policyholders")
+        print(f"• Correlated accidents: risk per policyholder levels off at about ${non_diversifiable_sd:,.0f}")
+        return
+
+    fig = Figure(figsize=(7, 9) if is_mobile else (14, 5))
+    ax = fig.add_subplot(111)
+    linewidth = 3 if is_mobile else 1.5
+
+    ax.plot(pool_sizes, independent_sd, color='#2ECC71', linewidth=linewidth, label='Independent accidents')
+    ax.plot(pool_sizes, correlated_sd, color='#E74C3C', linewidth=linewidth,
+            label=f'Correlated accidents ({dependence})')
+    ax.axhline(non_diversifiable_sd, color='#E74C3C', linestyle='--', alpha=0.6, linewidth=linewidth,
+               label='Non-diversifiable risk')
+
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: '{:,.0f}'.format(x)))
+    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: '${:,.0f}'.format(x)))
+    ax.set_xlabel('Number of Policyholders')
+    ax.set_ylabel('Std. Dev. of Loss per Policyholder ($)')
+    ax.set_title('Correlation Limits the Benefit of Pooling')
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+    fig.tight_layout()
+
+    return fig, stats
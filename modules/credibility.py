@@ -0,0 +1,206 @@
+import numpy as np
+from modules.cohorts import simulate_cohorts
+from modules.sampling import make_generator
+
+
+def experience_sums(values, exposures, group_ids, num_groups=None):
+    """
+    Sufficient statistics per risk from flat (risk, period) experience rows
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Observed rate of each row (e.g. claims per unit of exposure)
+    exposures : numpy.ndarray
+        Exposure (weight) of each row
+    group_ids : numpy.ndarray
+        Integer risk id of each row (driver or cohort)
+    num_groups : int
+        Number of risks (defaults to the largest id + 1)
+
+    Returns:
+    --------
+    sums : dict
+        Per-risk 'exposure', 'weighted_sum' (sum of m x), 'weighted_square_sum'
+        (sum of m x^2) and 'num_periods'
+    """
+    values = np.asarray(values, dtype=float)
+    exposures = np.asarray(exposures, dtype=float)
+    minlength = num_groups or 0
+
+    sums = {
+        'exposure': np.bincount(group_ids, weights=exposures, minlength=minlength),
+        'weighted_sum': np.bincount(group_ids, weights=exposures * values, minlength=minlength),
+        'weighted_square_sum': np.bincount(group_ids, weights=exposures * values ** 2, minlength=minlength),
+        'num_periods': np.bincount(group_ids, minlength=minlength)
+    }
+
+    return sums
+
+
+def buhlmann_straub(sums, collective_ids=None, complement=None):
+    """
+    Buhlmann-Straub credibility rates from per-risk sufficient statistics
+
+    The structural parameters (within-risk variance, between-risk variance) and the
+    collective mean are estimated separately for each collective (e.g. drivers within
+    their cohort), all with grouped reductions.
+
+    Parameters:
+    -----------
+    sums : dict
+        Output of experience_sums() (or the same statistics accumulated in a simulation)
+    collective_ids : numpy.ndarray
+        Collective of each risk. None puts all risks in one collective
+    complement : numpy.ndarray
+        Rate per collective that receives the weight 1 - Z. Defaults to the
+        credibility-weighted mean of the collective
+
+    Returns:
+    --------
+    result : dict
+        Per-risk 'mean', 'exposure', 'credibility' (Z) and 'rate', and per-collective
+        'within_variance', 'between_variance', 'k' and 'collective_mean'
+    """
+    exposure = sums['exposure']
+    num_periods = sums['num_periods']
+    observed = exposure > 0
+    mean = np.divide(sums['weighted_sum'], exposure, out=np.zeros_like(exposure), where=observed)
+
+    if collective_ids is None:
+        collective_ids = np.zeros(len(exposure), dtype=np.int64)
+    num_collectives = collective_ids.max() + 1
+
+    # Within-risk variance: sum of m (x - mean)^2 over all periods, per collective
+    squared_deviations = np.maximum(sums['weighted_square_sum'] - exposure * mean ** 2, 0.0)
+    degrees_of_freedom = np.bincount(collective_ids, weights=np.maximum(num_periods - 1, 0),
+                                     minlength=num_collectives)
+    within_variance = np.divide(np.bincount(collective_ids, weights=squared_deviations, minlength=num_collectives),
+                                degrees_of_freedom, out=np.zeros(num_collectives), where=degrees_of_freedom > 0)
+
+    # Between-risk variance within each collective
+    collective_exposure = np.bincount(collective_ids, weights=exposure, minlength=num_collectives)
+    collective_count = np.bincount(collective_ids, weights=observed, minlength=num_collectives)
+    exposure_mean = np.bincount(collective_ids, weights=exposure * mean,
+                                minlength=num_collectives) / np.maximum(collective_exposure, 1e-300)
+    spread = np.bincount(collective_ids, weights=exposure * (mean - exposure_mean[collective_ids]) ** 2,
+                         minlength=num_collectives)
+    denominator = collective_exposure - np.bincount(collective_ids, weights=exposure ** 2,
+                                                    minlength=num_collectives) / np.maximum(collective_exposure,
+                                                                                            1e-300)
+    between_variance = np.divide(spread - (collective_count - 1) * within_variance, denominator,
+                                 out=np.zeros(num_collectives), where=denominator > 0)
+    between_variance = np.maximum(between_variance, 0.0)
+
+    # k = within / between; no between-risk variance means no credibility for the risk itself
+    k = np.divide(within_variance, between_variance, out=np.full(num_collectives, np.inf),
+                  where=between_variance > 0)
+    credibility = exposure / (exposure + k[collective_ids])
+
+    credibility_total = np.bincount(collective_ids, weights=credibility, minlength=num_collectives)
+    collective_mean = np.where(credibility_total > 0,
+                               np.bincount(collective_ids, weights=credibility * mean, minlength=num_collectives)
+                               / np.maximum(credibility_total, 1e-300),
+                               exposure_mean)
+
+    if complement is None:
+        complement = collective_mean
+
+    result = {
+        'mean': mean,
+        'exposure': exposure,
+        'credibility': credibility,
+        'rate': credibility * mean + (1 - credibility) * np.asarray(complement)[collective_ids],
+        'within_variance': within_variance,
+        'between_variance': between_variance,
+        'k': k,
+        'collective_mean': collective_mean
+    }
+
+    return result
+
+
+def simulate_driver_experience(table, num_years=10, exposure_range=(0.5, 1.0), seed=42):
+    """
+    Simulates several years of claim experience for every driver of a cohort table
+
+    Each driver keeps one true frequency (drawn as in simulate_cohorts) and gets a random
+    exposure and a Poisson claim count per year. Only running per-driver and per-cohort
+    sums are kept, so memory does not grow with the number of years.
+
+    Parameters:
+    -----------
+    table : dict
+        Cohort table from make_cohort_table()
+    num_years : int
+        Years of experience per driver
+    exposure_range : tuple
+        Range of the uniform exposure (share of the year insured) per driver and year
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+
+    Returns:
+    --------
+    experience : dict
+        'drivers' and 'cohorts' experience_sums()-style statistics of the claim frequency,
+        'cohort_ids' of the drivers and their 'true_frequencies'
+    """
+    rng = make_generator(seed)
+    drivers = simulate_cohorts(table, rng)
+    cohort_ids = drivers['cohort_ids']
+    num_drivers = len(cohort_ids)
+    num_cohorts = len(table['name'])
+
+    def empty_sums(size):
+        return {'exposure': np.zeros(size), 'weighted_sum': np.zeros(size),
+                'weighted_square_sum': np.zeros(size), 'num_periods': np.full(size, num_years)}
+
+    driver_sums = empty_sums(num_drivers)
+    cohort_sums = empty_sums(num_cohorts)
+
+    for _ in range(num_years):
+        exposures = rng.uniform(*exposure_range, size=num_drivers)
+        claims = rng.poisson(drivers['frequencies'] * exposures).astype(float)
+
+        # Rate x = claims / exposure, so m x = claims and m x^2 = claims^2 / exposure
+        driver_sums['exposure'] += exposures
+        driver_sums['weighted_sum'] += claims
+        driver_sums['weighted_square_sum'] += claims ** 2 / exposures
+
+        cohort_exposures = np.bincount(cohort_ids, weights=exposures, minlength=num_cohorts)
+        cohort_claims = np.bincount(cohort_ids, weights=claims, minlength=num_cohorts)
+        cohort_sums['exposure'] += cohort_exposures
+        cohort_sums['weighted_sum'] += cohort_claims
+        cohort_sums['weighted_square_sum'] += cohort_claims ** 2 / cohort_exposures
+
+    experience = {
+        'drivers': driver_sums,
+        'cohorts': cohort_sums,
+        'cohort_ids': cohort_ids,
+        'true_frequencies': drivers['frequencies']
+    }
+
+    return experience
+
+
+def credibility_weighted_rates(experience):
+    """
+    Credibility-weighted claim frequencies for cohorts and for individual drivers
+
+    Cohort rates blend each cohort's experience with the portfolio mean. Driver rates
+    blend each driver's own experience with their cohort's credibility rate.
+
+    Parameters:
+    -----------
+    experience : dict
+        Output of simulate_driver_experience() (or loaded data in the same shape)
+
+    Returns:
+    --------
+    rates : dict
+        'cohort' and 'driver' buhlmann_straub() results
+    """
+    cohort = buhlmann_straub(experience['cohorts'])
+    driver = buhlmann_straub(experience['drivers'], experience['cohort_ids'], complement=cohort['rate'])
+
+    return {'cohort': cohort, 'driver': driver}
@@ -0,0 +1,196 @@
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+from modules.portfolio_loader import AGGREGATE_FIELDS, empty_aggregates, cohort_ids, add_policies, add_claims
+
+FILE_KINDS = ('policies', 'claims')
+
+
+def _file_signature(path):
+    """
+    Size and modification time of a file, used to tell whether it changed since it was ingested
+    """
+    status = os.stat(path)
+    return {'size': status.st_size, 'mtime': status.st_mtime_ns}
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Reads the aggregates and the list of ingested files saved by update_aggregates()
+
+    Parameters:
+    -----------
+    checkpoint_path : str
+        JSON checkpoint file. A missing file gives empty aggregates
+
+    Returns:
+    --------
+    aggregates : dict
+        Per-cohort aggregates, as returned by load_cohort_aggregates()
+    files : dict
+        Absolute path -> 'kind', 'size' and 'mtime' of every ingested file
+    """
+    if not os.path.exists(checkpoint_path):
+        return empty_aggregates(), {}
+
+    with open(checkpoint_path) as f:
+        state = json.load(f)
+
+    aggregates = {'cohorts': state['aggregates']['cohorts']}
+    aggregates.update({field: np.array(state['aggregates'][field], dtype=float) for field in AGGREGATE_FIELDS})
+
+    return aggregates, state['files']
+
+
+def write_checkpoint(checkpoint_path, aggregates, files):
+    """
+    Saves the aggregates and ingested files, replacing the checkpoint atomically
+    """
+    state = {
+        'aggregates': {'cohorts': list(aggregates['cohorts'])},
+        'files': files
+    }
+    state['aggregates'].update({field: aggregates[field].tolist() for field in AGGREGATE_FIELDS})
+
+    temporary_path = checkpoint_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary_path, checkpoint_path)
+
+
+def ingest_csv(aggregates, path, kind, cohort_column='cohort', value_column=None, chunksize=1000000):
+    """
+    Adds one policy or claims CSV to the per-cohort aggregates, reading it in bounded chunks
+
+    Only the cohort and value columns are parsed, and each chunk is reduced with
+    bincount before the next is read, so memory is bounded by the chunk size.
+
+    Parameters:
+    -----------
+    aggregates : dict
+        Per-cohort aggregates, updated in place
+    path : str
+        CSV file with one row per policy or per claim
+    kind : str
+        'policies' (value is the exposure) or 'claims' (value is the claim amount)
+    cohort_column : str
+        Name of the cohort (risk class) column
+    value_column : str
+        Name of the exposure / claim amount column. Defaults to 'exposure' or 'claim_amount'
+    chunksize : int
+        Rows per chunk
+
+    Returns:
+    --------
+    int
+        Number of rows added
+    """
+    if kind not in FILE_KINDS:
+        raise ValueError(f"kind must be one of {FILE_KINDS}, got {kind!r}")
+    if value_column is None:
+        value_column = 'exposure' if kind == 'policies' else 'claim_amount'
+
+    num_rows = 0
+    reader = pd.read_csv(path, usecols=[cohort_column, value_column], dtype={cohort_column: str},
+                         chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.dropna()
+
+        # Factorize so only the distinct labels of the chunk are looked up
+        codes, labels = pd.factorize(chunk[cohort_column])
+        ids = cohort_ids(aggregates, labels.to_numpy())[codes]
+        values = chunk[value_column].to_numpy(dtype=float)
+
+        if kind == 'policies':
+            add_policies(aggregates, ids, values)
+        else:
+            add_claims(aggregates, ids, values)
+        num_rows += len(chunk)
+
+    return num_rows
+
+
+def update_aggregates(checkpoint_path, policies_files=(), claims_files=(), cohort_column='cohort',
+                      exposure_column='exposure', amount_column='claim_amount', chunksize=1000000):
+    """
+    Brings the checkpointed per-cohort aggregates up to date with new CSV extracts
+
+    Files already recorded in the checkpoint are skipped, so appending a new month's
+    file only reads that file. The checkpoint is rewritten after each file, so an
+    interrupted run resumes from the last completed file. Ingested files are treated
+    as immutable: a recorded file whose size or modification time changed raises an
+    error, since its old rows cannot be taken back out of the sums.
+
+    Parameters:
+    -----------
+    checkpoint_path : str
+        JSON checkpoint file (created if missing)
+    policies_files, claims_files : list
+        CSV extracts with one row per policy / per claim
+    cohort_column : str
+        Name of the cohort column in both kinds of file
+    exposure_column : str
+        Name of the exposure column in the policy files
+    amount_column : str
+        Name of the claim amount column in the claims files
+    chunksize : int
+        Rows per chunk
+
+    Returns:
+    --------
+    result : dict
+        'aggregates', 'new_files' (paths ingested by this call) and 'rows_added'
+    """
+    aggregates, files = read_checkpoint(checkpoint_path)
+
+    pending = [(os.path.abspath(path), 'policies', exposure_column) for path in policies_files]
+    pending += [(os.path.abspath(path), 'claims', amount_column) for path in claims_files]
+
+    new_files = []
+    rows_added = 0
+    for path, kind, value_column in pending:
+        signature = _file_signature(path)
+        if path in files:
+            recorded = files[path]
+            if (recorded['size'], recorded['mtime']) != (signature['size'], signature['mtime']):
+                raise ValueError(f"{path} changed after it was ingested; rebuild the checkpoint to include it")
+            continue
+
+        rows_added += ingest_csv(aggregates, path, kind, cohort_column, value_column, chunksize)
+        files[path] = {'kind': kind, **signature}
+        write_checkpoint(checkpoint_path, aggregates, files)
+        new_files.append(path)
+
+    return {'aggregates': aggregates, 'new_files': new_files, 'rows_added': rows_added}
+
+
+def ingest_directory(directory, checkpoint_path=None, policies_pattern='policies*.csv',
+                     claims_pattern='claims*.csv', **ingest_args):
+    """
+    Ingests every new policy and claims CSV in a directory (e.g. one file per month)
+
+    Parameters:
+    -----------
+    directory : str
+        Directory holding the extracts
+    checkpoint_path : str
+        Checkpoint file. Defaults to aggregates_checkpoint.json in the directory
+    policies_pattern, claims_pattern : str
+        Glob patterns of the policy and claims files
+    **ingest_args
+        Column names and chunksize, see update_aggregates()
+
+    Returns:
+    --------
+    result : dict
+        See update_aggregates()
+    """
+    if checkpoint_path is None:
+        checkpoint_path = os.path.join(directory, 'aggregates_checkpoint.json')
+
+    return update_aggregates(checkpoint_path,
+                             sorted(glob.glob(os.path.join(directory, policies_pattern))),
+                             sorted(glob.glob(os.path.join(directory, claims_pattern))),
+                             **ingest_args)
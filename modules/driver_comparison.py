@@ -1,13 +1,54 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
+from matplotlib.colors import LinearSegmentedColormap, LogNorm
 from matplotlib.figure import Figure
-from scipy.stats import lognorm
+from modules.bootstrap import bootstrap_driver_comparison
+from modules.cohorts import DRIVER_SEVERITY_SIGMAS, driver_cohort_table, simulate_cohorts, cohort_slice
+from modules.moments import safe_ratio
+from modules.sampling import make_generator
+
+
+def _multiplier_text(multiplier, suffix='higher'):
+    """
+    '3.2x higher' style text for a cohort multiplier, or a note when it is undefined
+    """
+    if not np.isfinite(multiplier):
+        return "no first-cohort losses to compare"
+    return f"{multiplier:.1f}x {suffix}"
+
+
+def _stratified_sample(rng, values, num_points, num_strata=10):
+    """
+    Indices of about num_points values, drawn evenly from num_strata quantile bands of values
+    """
+    if len(values) <= num_points:
+        return np.arange(len(values))
+
+    order = np.argsort(values)
+    bounds = np.linspace(0, len(values), num_strata + 1).astype(np.int64)
+    per_stratum = -(-num_points // num_strata)
+    positions = np.concatenate([rng.integers(start, end, per_stratum)
+                                for start, end in zip(bounds[:-1], bounds[1:])])
+    return order[np.unique(positions)]
+
+
+def _draw_density_layer(ax, x, y, x_edges, y_edges, color):
+    """
+    Draws a 2D histogram of (x, y) as a translucent layer shaded from white to color (log counts)
+    """
+    counts, _, _ = np.histogram2d(x, y, bins=[x_edges, y_edges])
+    cmap = LinearSegmentedColormap.from_list('density', ['white', color])
+    ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), cmap=cmap, norm=LogNorm(), alpha=0.6,
+                  shading='flat')
 
 
 def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_driver_freq_multiplier=3.0,
                                   bad_driver_severity_multiplier=2.0, seed=42, return_fig=False,
-                                  good_driver_image="drake.jpeg", is_mobile=False):
+                                  good_driver_image="drake.jpeg", is_mobile=False, sampling='pseudo',
+                                  claim_level=False, confidence_intervals=False, num_drivers=None,
+                                  render_mode='auto', density_threshold=2000, cohort_names=None,
+                                  severity_sigmas=DRIVER_SEVERITY_SIGMAS):
     """
     Demonstrates the difference in outcomes between driver cohorts
 
@@ -21,7 +62,7 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
         How much more frequently second cohort has accidents
     bad_driver_severity_multiplier : float
         How much more severe second cohort's accidents are
-    seed : int
+    seed : int or numpy.random.Generator
         Random seed for reproducibility
     return_fig : bool
         If True, returns the figure and stats for Shiny integration
@@ -29,6 +70,30 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
         Image filename to use for the first cohort (either "drake.jpeg" or "kendrick.jpeg")
     is_mobile : bool
         Whether to use mobile-optimized visualization
+    sampling : str
+        'pseudo' for pseudo-random draws or 'sobol' for scrambled Sobol points
+        (one dimension for frequency, one for severity)
+    claim_level : bool
+        If True, each driver gets a Poisson number of claims with lognormal amounts (see
+        modules.claim_simulation) and the stats describe those claims: frequency is claims per
+        driver, severity is the average claim amount and total losses are the actual losses.
+        Otherwise they are averages of the drivers' parameters, and total losses are average
+        frequency x average severity x drivers
+    confidence_intervals : bool
+        If True, adds bootstrap confidence intervals for every statistic to the stats
+        under 'confidence_intervals' (see modules.bootstrap)
+    num_drivers : int
+        Drivers per cohort. None uses 200 (80 on mobile)
+    render_mode : str
+        'scatter' draws every driver, 'density' draws pre-binned 2D histograms plus a
+        stratified sample of highlighted drivers, 'auto' switches to 'density' when a
+        cohort has more than density_threshold drivers
+    density_threshold : int
+        Cohort size above which 'auto' uses the density rendering
+    cohort_names : tuple
+        (first, second) cohort names replacing the driver-based ones, e.g. loaded portfolio cohorts
+    severity_sigmas : tuple
+        (first, second) lognormal shape of each cohort's claim amounts
 
     Returns:
     --------
@@ -56,58 +121,64 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
                 color=['#3498DB', '#2ECC71', '#E74C3C', '#9B59B6', '#F39C12', '#1ABC9C']),
         })
 
-    # Set random seed for reproducibility
-    np.random.seed(seed)
+    # Isolated random stream for reproducibility
+    rng = make_generator(seed)
 
     # Extract driver names from image filename
     good_driver_name = good_driver_image.split('.')[0].capitalize()
     bad_driver_name = "Kendrick" if good_driver_name == "Drake" else "Drake"
 
     # Use specific cohort names
-    first_cohort_name = f"{good_driver_name} Cohort"
-    second_cohort_name = f"{bad_driver_name} Cohort"
-
-    # Define parameters for each driver type
-    second_cohort_frequency = base_frequency * bad_driver_freq_multiplier
-    second_cohort_severity = base_severity * bad_driver_severity_multiplier
+    if cohort_names is not None:
+        first_cohort_name, second_cohort_name = cohort_names
+    else:
+        first_cohort_name = f"{good_driver_name} Cohort"
+        second_cohort_name = f"{bad_driver_name} Cohort"
 
     # Number of drivers to simulate - reduce for mobile
-    if is_mobile:
+    if num_drivers is not None:
+        num_first_cohort = num_drivers
+        num_second_cohort = num_drivers
+    elif is_mobile:
         num_first_cohort = 80  # Further reduced for mobile
         num_second_cohort = 80
     else:
         num_first_cohort = 200
         num_second_cohort = 200
 
-    # Parameters for lognormal distribution
-    first_sigma = 0.4  # Smaller sigma for first cohort (less variance)
-    second_sigma = 0.6  # Larger sigma for second cohort (more variance)
-
-    # Calculate mu so that the median of the lognormal is our target severity
-    first_mu = np.log(base_severity) - 0.5 * first_sigma ** 2
-    second_mu = np.log(second_cohort_severity) - 0.5 * second_sigma ** 2
+    # Both cohorts are simulated in one batched draw from a two-row cohort table
+    cohorts = driver_cohort_table(base_frequency, base_severity, bad_driver_freq_multiplier,
+                                  bad_driver_severity_multiplier, [num_first_cohort, num_second_cohort],
+                                  [first_cohort_name, second_cohort_name], severity_sigmas)
+    results = simulate_cohorts(cohorts, rng, sampling, claim_level)
 
-    # Generate individual driver frequencies
-    first_cohort_frequencies = np.random.normal(base_frequency, base_frequency * 0.3, num_first_cohort)
-    first_cohort_frequencies = np.maximum(first_cohort_frequencies, 0.001)  # Minimum 0.1% frequency
+    second_cohort_frequency, second_cohort_severity = cohorts['frequency'][1], cohorts['severity'][1]
+    first_mu, second_mu = cohorts['severity_mu']
+    first_sigma, second_sigma = cohorts['severity_sigma']
 
-    second_cohort_frequencies = np.random.normal(second_cohort_frequency, second_cohort_frequency * 0.3,
-                                                 num_second_cohort)
-    second_cohort_frequencies = np.maximum(second_cohort_frequencies, 0.001)  # Minimum 0.1% frequency
-
-    # Generate individual driver severities (using lognormal)
-    first_cohort_severities = lognorm.rvs(first_sigma, scale=np.exp(first_mu), size=num_first_cohort)
-    second_cohort_severities = lognorm.rvs(second_sigma, scale=np.exp(second_mu), size=num_second_cohort)
+    first_cohort_frequencies = cohort_slice(cohorts, results, 0, 'frequencies')
+    second_cohort_frequencies = cohort_slice(cohorts, results, 1, 'frequencies')
+    first_cohort_severities = cohort_slice(cohorts, results, 0, 'severities')
+    second_cohort_severities = cohort_slice(cohorts, results, 1, 'severities')
 
     # Calculate statistics
-    first_avg_frequency = np.mean(first_cohort_frequencies)
-    second_avg_frequency = np.mean(second_cohort_frequencies)
-
-    first_avg_severity = np.mean(first_cohort_severities)
-    second_avg_severity = np.mean(second_cohort_severities)
+    first_avg_frequency, second_avg_frequency = results['avg_frequency']
+    first_avg_severity, second_avg_severity = results['avg_severity']
+
+    # Claim-level stats describe the simulated claims: claims per driver, amount per claim and actual losses
+    if claim_level:
+        first_avg_frequency, second_avg_frequency = results['num_claims'] / cohorts['num_drivers']
+        first_avg_severity, second_avg_severity = safe_ratio(results['actual_losses'], results['num_claims'])
+        first_total_losses, second_total_losses = results['actual_losses']
+        loss_label = "Total Simulated Loss"
+    else:
+        first_total_losses, second_total_losses = results['total_losses']
+        loss_label = "Total Expected Loss"
 
-    first_total_losses = first_avg_frequency * first_avg_severity * num_first_cohort
-    second_total_losses = second_avg_frequency * second_avg_severity * num_second_cohort
+    # NaN when the first cohort had no claims (possible with claim-level losses)
+    loss_multiplier = safe_ratio(second_total_losses, first_total_losses)
+    freq_multiplier = safe_ratio(second_avg_frequency, first_avg_frequency)
+    severity_multiplier = safe_ratio(second_avg_severity, first_avg_severity)
 
     # For Shiny integration
     if return_fig:
@@ -122,10 +193,6 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
         ax1 = fig.add_subplot(111)  # Main scatterplot
 
         # Plot: Scatter plot of driver risk profiles
-        # Add small jitter to separate overlapping points
-        jitter_x_first = np.random.normal(0, 0.001, num_first_cohort)
-        jitter_x_second = np.random.normal(0, 0.001, num_second_cohort)
-
         # Point size - larger for mobile to be more touch-friendly
         point_size = 80 if is_mobile else 70
 
@@ -143,26 +210,58 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
             second_edge = 'darkred'
             alpha = 0.7
 
-        ax1.scatter(
-            first_cohort_frequencies + jitter_x_first,
-            first_cohort_severities,
-            color=first_color,
-            alpha=alpha,
-            s=point_size,
-            label=f'{first_cohort_name}',
-            edgecolors=first_edge
-        )
+        if render_mode == 'auto':
+            render_mode = 'density' if max(num_first_cohort, num_second_cohort) > density_threshold else 'scatter'
+
+        if render_mode == 'scatter':
+            # Add small jitter to separate overlapping points
+            jitter_x_first = rng.normal(0, 0.001, num_first_cohort)
+            jitter_x_second = rng.normal(0, 0.001, num_second_cohort)
+
+            ax1.scatter(
+                first_cohort_frequencies + jitter_x_first,
+                first_cohort_severities,
+                color=first_color,
+                alpha=alpha,
+                s=point_size,
+                label=f'{first_cohort_name}',
+                edgecolors=first_edge
+            )
 
-        # Scatter plot for second cohort
-        ax1.scatter(
-            second_cohort_frequencies + jitter_x_second,
-            second_cohort_severities,
-            color=second_color,
-            alpha=alpha,
-            s=point_size,
-            label=f'{second_cohort_name}',
-            edgecolors=second_edge
-        )
+            # Scatter plot for second cohort
+            ax1.scatter(
+                second_cohort_frequencies + jitter_x_second,
+                second_cohort_severities,
+                color=second_color,
+                alpha=alpha,
+                s=point_size,
+                label=f'{second_cohort_name}',
+                edgecolors=second_edge
+            )
+        else:
+            # Pre-binned density layers: the image cost depends on the bins, not the drivers
+            all_frequencies = np.concatenate([first_cohort_frequencies, second_cohort_frequencies])
+            all_severities = np.concatenate([first_cohort_severities, second_cohort_severities])
+            x_edges = np.linspace(*np.quantile(all_frequencies, [0.0, 0.999]), 121)
+            y_edges = np.linspace(*np.quantile(all_severities, [0.0, 0.999]), 121)
+
+            for frequencies, severities, color, edge, name in (
+                    (first_cohort_frequencies, first_cohort_severities, first_color, first_edge, first_cohort_name),
+                    (second_cohort_frequencies, second_cohort_severities, second_color, second_edge,
+                     second_cohort_name)):
+                _draw_density_layer(ax1, frequencies, severities, x_edges, y_edges, color)
+
+                # A fixed number of highlighted drivers, spread over the range of expected losses
+                highlighted = _stratified_sample(rng, frequencies * severities, 100)
+                ax1.scatter(
+                    frequencies[highlighted],
+                    severities[highlighted],
+                    color=color,
+                    alpha=alpha,
+                    s=point_size / 2,
+                    label=f'{name} ({len(highlighted)} of {len(frequencies):,} shown)',
+                    edgecolors=edge
+                )
 
         # Add center points for each cluster - make them more prominent
         center_point_size = 200 if is_mobile else 150
@@ -277,11 +376,11 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
                 f"{first_cohort_name}:\n"
                 f"• Avg Frequency: {first_avg_frequency:.1%}\n"
                 f"• Avg Claim Amount: ${first_avg_severity:,.0f}\n"
-                f"• Total Expected Loss: ${first_total_losses:,.0f}\n\n"
+                f"• {loss_label}: ${first_total_losses:,.0f}\n\n"
                 f"{second_cohort_name}:\n"
-                f"• Avg Frequency: {second_avg_frequency:.1%} ({second_avg_frequency / first_avg_frequency:.1f}x higher)\n"
-                f"• Avg Claim Amount: ${second_avg_severity:,.0f} ({second_avg_severity / first_avg_severity:.1f}x higher)\n"
-                f"• Total Expected Loss: ${second_total_losses:,.0f} ({second_total_losses / first_total_losses:.1f}x higher)"
+                f"• Avg Frequency: {second_avg_frequency:.1%} ({_multiplier_text(freq_multiplier)})\n"
+                f"• Avg Claim Amount: ${second_avg_severity:,.0f} ({_multiplier_text(severity_multiplier)})\n"
+                f"• {loss_label}: ${second_total_losses:,.0f} ({_multiplier_text(loss_multiplier)})"
             )
 
             # Place text box on the right side (LEFT JUSTIFIED)
@@ -300,7 +399,7 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
                 f"Risk Comparison:\n"
                 f"• {first_cohort_name}: {first_avg_frequency:.1%} freq, ${first_avg_severity:,.0f} claims\n"
                 f"• {second_cohort_name}: {second_avg_frequency:.1%} freq, ${second_avg_severity:,.0f} claims\n"
-                f"• Difference: {second_total_losses / first_total_losses:.1f}x higher risk"
+                f"• Difference: {_multiplier_text(loss_multiplier, 'higher risk')}"
             )
 
             # Place at top of chart
@@ -321,9 +420,13 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
             'bad_avg_severity': second_avg_severity,
             'good_total_losses': first_total_losses,
             'bad_total_losses': second_total_losses,
-            'loss_multiplier': second_total_losses / first_total_losses,
-            'freq_multiplier': second_avg_frequency / first_avg_frequency,
-            'severity_multiplier': second_avg_severity / first_avg_severity,
+            'loss_multiplier': loss_multiplier,
+            'freq_multiplier': freq_multiplier,
+            'severity_multiplier': severity_multiplier,
+            'good_severity_mu': first_mu,
+            'good_severity_sigma': first_sigma,
+            'bad_severity_mu': second_mu,
+            'bad_severity_sigma': second_sigma,
             'good_driver_image': good_driver_image,
             'good_driver_name': good_driver_name,
             'bad_driver_name': bad_driver_name,
@@ -331,6 +434,18 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
             'second_cohort_name': second_cohort_name
         }
 
+        if confidence_intervals:
+            # Claim-level stats come from the simulated claims, so their intervals resample the
+            # drivers' claim counts and losses
+            if claim_level:
+                driver_values = [cohort_slice(cohorts, results, cohort, key)
+                                 for cohort in (0, 1) for key in ('claim_counts', 'driver_losses')]
+            else:
+                driver_values = [first_cohort_frequencies, first_cohort_severities,
+                                 second_cohort_frequencies, second_cohort_severities]
+            stats['confidence_intervals'] = bootstrap_driver_comparison(*driver_values, seed=rng,
+                                                                        claim_level=claim_level)
+
         return fig, stats
 
     # Original function for compatibility
@@ -349,4 +464,4 @@ def demonstrate_driver_comparison(base_frequency=0.05, base_severity=8000, bad_d
             f"• {second_cohort_name}: {second_avg_frequency:.1%} accident rate, ${second_avg_severity:,.2f} avg severity")
         print(f"• {first_cohort_name} total loss: ${first_total_losses:,.0f}")
         print(
-            f"• {second_cohort_name} total loss: ${second_total_losses:,.0f} ({second_total_losses / first_total_losses:.1f}x higher)")
\ No newline at end of file
+            f"• {second_cohort_name} total loss: ${second_total_losses:,.0f} ({_multiplier_text(loss_multiplier)})")
\ No newline at end of file
@@ -0,0 +1,317 @@
+import numpy as np
+from scipy import sparse
+from modules.ethics import get_ethics_questions
+from modules.sampling import make_generator
+
+# Levels of each rating variable the ethics tab considers acceptable (keyed by question id),
+# with the frequency and severity relativities used to simulate portfolios. The first
+# level of each variable is the base level.
+RATING_LEVELS = {
+    'age_rating': {
+        'levels': ['26-40', '16-25', '41-60', '61+'],
+        'frequency': [1.0, 1.8, 0.9, 1.1],
+        'severity': [1.0, 1.1, 1.0, 1.05]
+    },
+    'vehicle_rating': {
+        'levels': ['Sedan', 'SUV', 'Sports Car', 'Pickup', 'Minivan'],
+        'frequency': [1.0, 1.05, 1.4, 1.1, 0.9],
+        'severity': [1.0, 1.15, 1.5, 1.2, 1.0]
+    },
+    'experience_rating': {
+        'levels': ['3-10 years', '0-2 years', '11+ years'],
+        'frequency': [1.0, 1.5, 0.85],
+        'severity': [1.0, 1.0, 1.0]
+    },
+    'multiproduct_rating': {
+        'levels': ['Auto only', 'Multi-product'],
+        'frequency': [1.0, 0.9],
+        'severity': [1.0, 1.0]
+    },
+    'speeding_rating': {
+        'levels': ['None', '1 conviction', '2+ convictions'],
+        'frequency': [1.0, 1.3, 1.7],
+        'severity': [1.0, 1.05, 1.1]
+    },
+    'driving_rating': {
+        'levels': ['Clean', '1 at-fault accident', '2+ at-fault accidents'],
+        'frequency': [1.0, 1.4, 2.0],
+        'severity': [1.0, 1.0, 1.05]
+    }
+}
+
+GLM_FAMILIES = ('poisson', 'gamma')
+
+
+def rating_variable_ids():
+    """
+    Ids of the ethics questions marked as acceptable rating variables
+    """
+    return [question['id'] for question in get_ethics_questions()
+            if question['ethical'] and question['id'] in RATING_LEVELS]
+
+
+def one_hot_design(codes, num_levels, dense=False):
+    """
+    Builds an intercept + one-hot (base level dropped) design matrix from integer-coded variables
+
+    Parameters:
+    -----------
+    codes : dict
+        Variable name -> integer level code of each row (0 is the base level)
+    num_levels : dict
+        Variable name -> number of levels
+    dense : bool
+        If True, returns a dense numpy array instead of a sparse CSR matrix
+
+    Returns:
+    --------
+    X : scipy.sparse.csr_matrix or numpy.ndarray
+        Design matrix with one intercept column and num_levels - 1 columns per variable
+    column_names : list
+        (variable, level code) of each column, ('intercept', 0) first
+    """
+    names = list(codes)
+    num_rows = len(codes[names[0]])
+
+    column_names = [('intercept', 0)]
+    first_column = {}
+    for name in names:
+        first_column[name] = len(column_names)
+        column_names += [(name, level) for level in range(1, num_levels[name])]
+
+    # Every row has a 1 in the intercept column and in at most one column per variable
+    rows = [np.arange(num_rows)]
+    cols = [np.zeros(num_rows, dtype=np.int64)]
+    for name in names:
+        level = np.asarray(codes[name])
+        non_base = np.flatnonzero(level > 0)
+        rows.append(non_base)
+        cols.append(first_column[name] + level[non_base] - 1)
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    X = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(num_rows, len(column_names)))
+
+    if dense:
+        return X.toarray(), column_names
+
+    return X, column_names
+
+
+def _weighted_normal_equations(X, weights, working_response, chunk_size):
+    """
+    X' W X and X' W z, accumulated over row chunks to bound temporary memory
+
+    Sparse chunks are expanded to small dense blocks so the p x p products run in BLAS.
+    """
+    num_columns = X.shape[1]
+    xtwx = np.zeros((num_columns, num_columns))
+    xtwz = np.zeros(num_columns)
+
+    for start in range(0, X.shape[0], chunk_size):
+        rows = slice(start, start + chunk_size)
+        block = X[rows].toarray() if sparse.issparse(X) else X[rows]
+        weighted = block * weights[rows, None]
+        xtwx += block.T @ weighted
+        xtwz += weighted.T @ working_response[rows]
+
+    return xtwx, xtwz
+
+
+def _deviance(family, y, mu, weights):
+    """
+    Total deviance of a Poisson or Gamma model
+    """
+    if family == 'poisson':
+        ratio = np.where(y > 0, y / mu, 1.0)
+        return 2 * np.sum(weights * (y * np.log(ratio) - (y - mu)))
+
+    return 2 * np.sum(weights * ((y - mu) / mu - np.log(y / mu)))
+
+
+def fit_glm(X, y, family='poisson', offset=None, weights=None, max_iter=25, tol=1e-8, chunk_size=50000,
+            column_names=None):
+    """
+    Fits a log-link Poisson (frequency) or Gamma (severity) GLM by iteratively reweighted least squares
+
+    Each iteration solves the weighted normal equations X' W X b = X' W z, with X' W X
+    accumulated in row batches (a small p x p matrix), so the cost is linear in the rows
+    and a sparse design is never expanded beyond one batch.
+
+    Parameters:
+    -----------
+    X : scipy.sparse matrix or numpy.ndarray
+        Design matrix with an intercept column first (see one_hot_design)
+    y : numpy.ndarray
+        Response: claim counts (Poisson) or average claim amounts (Gamma, positive)
+    family : str
+        'poisson' or 'gamma'
+    offset : numpy.ndarray
+        Known part of the linear predictor, e.g. log(exposure) for claim frequencies
+    weights : numpy.ndarray
+        Prior weights, e.g. claim counts behind each average claim amount
+    max_iter : int
+        Maximum number of IRLS iterations
+    tol : float
+        Convergence tolerance on the relative change in deviance
+    chunk_size : int
+        Rows per chunk when accumulating the normal equations
+    column_names : list
+        Names of the design columns (reported with the coefficients)
+
+    Returns:
+    --------
+    result : dict
+        'coefficients', 'relativities' (exp of coefficients), 'standard_errors',
+        'deviance', 'dispersion', 'iterations', 'converged' and 'column_names'
+    """
+    if family not in GLM_FAMILIES:
+        raise ValueError(f"family must be one of {GLM_FAMILIES}, got {family!r}")
+
+    y = np.asarray(y, dtype=float)
+    offset = np.zeros(len(y)) if offset is None else np.asarray(offset, dtype=float)
+    weights = np.ones(len(y)) if weights is None else np.asarray(weights, dtype=float)
+
+    # Start from the intercept-only fit
+    coefficients = np.zeros(X.shape[1])
+    if family == 'poisson':
+        coefficients[0] = np.log(np.sum(weights * y) / np.sum(weights * np.exp(offset)))
+    else:
+        coefficients[0] = np.log(np.sum(weights * y) / np.sum(weights)) - np.log(
+            np.sum(weights * np.exp(offset)) / np.sum(weights))
+
+    deviance = np.inf
+    converged = False
+    for iteration in range(1, max_iter + 1):
+        eta = X @ coefficients + offset
+        mu = np.exp(eta)
+
+        # Log link: z = eta - offset + (y - mu) / mu; working weights mu (Poisson) or 1 (Gamma)
+        working_response = eta - offset + (y - mu) / mu
+        working_weights = weights * mu if family == 'poisson' else weights
+
+        xtwx, xtwz = _weighted_normal_equations(X, working_weights, working_response, chunk_size)
+        coefficients = np.linalg.solve(xtwx, xtwz)
+
+        mu = np.exp(X @ coefficients + offset)
+        new_deviance = _deviance(family, y, mu, weights)
+        if abs(deviance - new_deviance) <= tol * (abs(new_deviance) + 0.1):
+            converged = True
+            deviance = new_deviance
+            break
+        deviance = new_deviance
+
+    # Dispersion is 1 for Poisson; Pearson estimate for Gamma
+    degrees_of_freedom = max(len(y) - X.shape[1], 1)
+    if family == 'poisson':
+        dispersion = 1.0
+        information_weights = weights * mu
+    else:
+        dispersion = np.sum(weights * ((y - mu) / mu) ** 2) / degrees_of_freedom
+        information_weights = weights
+
+    information, _ = _weighted_normal_equations(X, information_weights, np.zeros(len(y)), chunk_size)
+    standard_errors = np.sqrt(np.diag(np.linalg.inv(information)) * dispersion)
+
+    result = {
+        'coefficients': coefficients,
+        'relativities': np.exp(coefficients),
+        'standard_errors': standard_errors,
+        'deviance': deviance,
+        'dispersion': dispersion,
+        'iterations': iteration,
+        'converged': converged,
+        'column_names': column_names
+    }
+
+    return result
+
+
+def simulate_rating_portfolio(num_policies=1000000, base_frequency=0.05, base_severity=8000, severity_shape=2.0,
+                              seed=42):
+    """
+    Simulates policies with rating variables, exposure, claim counts and average claim amounts
+
+    Frequencies and severities are the base values times the RATING_LEVELS relativities,
+    so a fitted GLM should recover those relativities.
+
+    Parameters:
+    -----------
+    num_policies : int
+        Number of policy rows
+    base_frequency : float
+        Claim frequency of a full-year policy at every base level
+    base_severity : float
+        Mean claim amount at every base level
+    severity_shape : float
+        Gamma shape of individual claim amounts
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+
+    Returns:
+    --------
+    portfolio : dict
+        'codes' (variable -> level codes, int8), 'num_levels', 'exposure', 'claim_counts',
+        'average_claim' (0 where there are no claims)
+    """
+    rng = make_generator(seed)
+    variables = rating_variable_ids()
+
+    codes = {}
+    frequency = np.full(num_policies, base_frequency)
+    severity = np.full(num_policies, float(base_severity))
+    for name in variables:
+        table = RATING_LEVELS[name]
+        codes[name] = rng.integers(0, len(table['levels']), num_policies).astype(np.int8)
+        frequency *= np.take(table['frequency'], codes[name])
+        severity *= np.take(table['severity'], codes[name])
+
+    exposure = rng.uniform(0.25, 1.0, num_policies)
+    claim_counts = rng.poisson(frequency * exposure)
+
+    # The mean of n Gamma(shape, scale) claims is Gamma(n * shape, scale / n)
+    has_claims = claim_counts > 0
+    average_claim = np.zeros(num_policies)
+    n = claim_counts[has_claims]
+    average_claim[has_claims] = rng.gamma(n * severity_shape, severity[has_claims] / (severity_shape * n))
+
+    portfolio = {
+        'codes': codes,
+        'num_levels': {name: len(RATING_LEVELS[name]['levels']) for name in variables},
+        'exposure': exposure,
+        'claim_counts': claim_counts,
+        'average_claim': average_claim
+    }
+
+    return portfolio
+
+
+def fit_rating_glms(portfolio, dense=False, chunk_size=50000):
+    """
+    Fits the frequency (Poisson, log exposure offset) and severity (Gamma, claim-count weights) GLMs
+
+    Parameters:
+    -----------
+    portfolio : dict
+        Output of simulate_rating_portfolio() (or loaded data in the same shape)
+    dense : bool
+        If True, uses a dense design matrix (for benchmarking)
+    chunk_size : int
+        Rows per IRLS batch
+
+    Returns:
+    --------
+    fits : dict
+        'frequency' and 'severity' fit_glm() results
+    """
+    X, column_names = one_hot_design(portfolio['codes'], portfolio['num_levels'], dense)
+
+    frequency = fit_glm(X, portfolio['claim_counts'], 'poisson', offset=np.log(portfolio['exposure']),
+                        chunk_size=chunk_size, column_names=column_names)
+
+    has_claims = np.flatnonzero(portfolio['claim_counts'] > 0)
+    severity = fit_glm(X[has_claims], portfolio['average_claim'][has_claims], 'gamma',
+                       weights=portfolio['claim_counts'][has_claims], chunk_size=chunk_size,
+                       column_names=column_names)
+
+    return {'frequency': frequency, 'severity': severity}
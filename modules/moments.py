@@ -0,0 +1,131 @@
+import numpy as np
+
+
+def chunk_summary(values, bin_edges=None):
+    """
+    Summarises one chunk of simulated values so it can be merged with other chunks
+
+    Parameters:
+    -----------
+    values : numpy.ndarray
+        Simulated values (e.g. pool losses per path or losses per driver)
+    bin_edges : numpy.ndarray
+        Optional fixed histogram bin edges shared by all chunks
+
+    Returns:
+    --------
+    summary : dict
+        Count, mean, sum of squared deviations (m2), min, max and histogram counts
+    """
+    values = np.asarray(values, dtype=float).ravel()
+    count = len(values)
+
+    if count:
+        mean = values.mean()
+        m2 = np.dot(values - mean, values - mean)
+        minimum = values.min()
+        maximum = values.max()
+    else:
+        mean, m2, minimum, maximum = 0.0, 0.0, np.inf, -np.inf
+
+    summary = {
+        'count': count,
+        'mean': mean,
+        'm2': m2,
+        'min': minimum,
+        'max': maximum
+    }
+
+    if bin_edges is not None:
+        summary['histogram'] = np.histogram(values, bins=bin_edges)[0]
+        summary['bin_edges'] = bin_edges
+
+    return summary
+
+
+def merge_summaries(first, second):
+    """
+    Merges two chunk summaries (Chan et al. parallel update of mean and variance)
+
+    Merging the same chunks in the same order always gives the same floating point result.
+
+    Parameters:
+    -----------
+    first : dict
+        Summary from chunk_summary() or merge_summaries()
+    second : dict
+        Summary from chunk_summary() or merge_summaries()
+
+    Returns:
+    --------
+    summary : dict
+        Combined summary
+    """
+    count = first['count'] + second['count']
+
+    if count == 0:
+        return dict(first)
+
+    delta = second['mean'] - first['mean']
+    mean = first['mean'] + delta * second['count'] / count
+    m2 = first['m2'] + second['m2'] + delta ** 2 * first['count'] * second['count'] / count
+
+    summary = {
+        'count': count,
+        'mean': mean,
+        'm2': m2,
+        'min': min(first['min'], second['min']),
+        'max': max(first['max'], second['max'])
+    }
+
+    if 'histogram' in first:
+        summary['histogram'] = first['histogram'] + second['histogram']
+        summary['bin_edges'] = first['bin_edges']
+
+    return summary
+
+
+def summary_statistics(summary):
+    """
+    Converts a merged summary into the usual statistics
+
+    Parameters:
+    -----------
+    summary : dict
+        Summary from chunk_summary() or merge_summaries()
+
+    Returns:
+    --------
+    stats : dict
+        Count, mean, variance, standard deviation, standard error, min and max
+    """
+    count = summary['count']
+    variance = summary['m2'] / (count - 1) if count > 1 else 0.0
+
+    stats = {
+        'count': count,
+        'mean': summary['mean'],
+        'variance': variance,
+        'std': np.sqrt(variance),
+        'standard_error': np.sqrt(variance / count) if count else np.nan,
+        'min': summary['min'],
+        'max': summary['max']
+    }
+
+    if 'histogram' in summary:
+        stats['histogram'] = summary['histogram']
+        stats['bin_edges'] = summary['bin_edges']
+
+    return stats
+
+
+def safe_ratio(numerator, denominator):
+    """
+    Elementwise numerator / denominator, NaN where the denominator is zero (e.g. a cohort
+    with no simulated claims)
+    """
+    numerator, denominator = np.broadcast_arrays(np.asarray(numerator, dtype=float),
+                                                 np.asarray(denominator, dtype=float))
+    ratio = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=ratio, where=denominator != 0)
+    return ratio if ratio.ndim else float(ratio)
@@ -0,0 +1,139 @@
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+from modules.claim_simulation import simulate_claims
+from modules.moments import chunk_summary, merge_summaries, summary_statistics
+from modules.risk_pooling import CLAIM_AMOUNT
+from modules.sampling import make_generator, seed_sequence
+
+
+def risk_pool_losses(rng, num_samples, accident_probability=0.05, num_policyholders=100):
+    """
+    Chunk kernel: total losses of num_samples independent one-year risk pools
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream for this chunk
+    num_samples : int
+        Number of pools (paths) to simulate
+    accident_probability : float
+        The probability of an accident
+    num_policyholders : int
+        The number of policyholders in each pool
+
+    Returns:
+    --------
+    numpy.ndarray
+        Total losses of each pool
+    """
+    return rng.binomial(num_policyholders, accident_probability, size=num_samples) * float(CLAIM_AMOUNT)
+
+
+def driver_losses(rng, num_samples, frequency=0.05, severity_mu=8.9, severity_sigma=0.4):
+    """
+    Chunk kernel: annual losses of num_samples drivers with Poisson claims and lognormal claim amounts
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream for this chunk
+    num_samples : int
+        Number of drivers to simulate
+    frequency : float
+        Expected number of claims per driver per year
+    severity_mu : float
+        Lognormal location parameter of a claim amount
+    severity_sigma : float
+        Lognormal shape parameter of a claim amount
+
+    Returns:
+    --------
+    numpy.ndarray
+        Total losses of each driver
+    """
+    return simulate_claims(rng, np.full(num_samples, frequency), severity_mu, severity_sigma)['driver_losses']
+
+
+def _run_chunk(task):
+    """
+    Runs one chunk in a worker process and returns its mergeable summary
+    """
+    kernel, num_samples, child_seed, bin_edges, kernel_args = task
+    values = kernel(make_generator(child_seed), num_samples, **kernel_args)
+    return chunk_summary(values, bin_edges)
+
+
+def chunk_sizes(num_samples, chunk_size):
+    """
+    Splits num_samples into fixed-size chunks (the last one may be smaller)
+    """
+    num_chunks = -(-num_samples // chunk_size)
+    sizes = [chunk_size] * num_chunks
+    sizes[-1] = num_samples - chunk_size * (num_chunks - 1)
+    return sizes
+
+
+def run_parallel_simulation(kernel, num_samples, chunk_size=1000000, seed=42, max_workers=None,
+                            bin_edges=None, executor=None, **kernel_args):
+    """
+    Runs a large Monte Carlo simulation in chunks across worker processes
+
+    Chunk boundaries depend only on num_samples and chunk_size, every chunk gets its own
+    child of SeedSequence(seed), and the partial summaries are merged in chunk order.
+    The result is therefore bit-for-bit identical for any number of workers.
+
+    Parameters:
+    -----------
+    kernel : callable
+        Module-level function kernel(rng, num_samples, **kernel_args) returning simulated values,
+        e.g. risk_pool_losses or driver_losses
+    num_samples : int
+        Total number of values to simulate (paths, policyholders or drivers)
+    chunk_size : int
+        Number of values per chunk
+    seed : int or numpy.random.SeedSequence
+        Random seed for reproducibility
+    max_workers : int
+        Number of worker processes. 1 runs in the current process. Defaults to the CPU count
+    bin_edges : numpy.ndarray
+        Optional fixed histogram bin edges
+    executor : concurrent.futures.Executor
+        Optional existing executor to reuse (avoids process start-up per call)
+    **kernel_args :
+        Extra parameters passed to the kernel
+
+    Returns:
+    --------
+    stats : dict
+        Merged statistics (count, mean, variance, std, standard error, min, max, histogram)
+    """
+    if num_samples < 1:
+        raise ValueError(f"num_samples must be at least 1, got {num_samples}")
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    if max_workers is not None and max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+
+    seed = seed_sequence(seed)
+
+    sizes = chunk_sizes(num_samples, chunk_size)
+    child_seeds = seed.spawn(len(sizes))
+
+    if bin_edges is not None:
+        bin_edges = np.asarray(bin_edges, dtype=float)
+
+    tasks = [(kernel, size, child, bin_edges, kernel_args) for size, child in zip(sizes, child_seeds)]
+
+    if executor is not None:
+        summaries = list(executor.map(_run_chunk, tasks))
+    elif max_workers == 1 or len(tasks) == 1:
+        summaries = [_run_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            summaries = list(pool.map(_run_chunk, tasks))
+
+    stats = summary_statistics(reduce(merge_summaries, summaries))
+    stats['num_chunks'] = len(tasks)
+
+    return stats
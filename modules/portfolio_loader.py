@@ -0,0 +1,314 @@
+import os
+import numpy as np
+from modules.cohorts import make_cohort_table
+
+# Environment variables that point the app at policy and claims extracts
+POLICIES_PATH_VARIABLE = 'PORTFOLIO_POLICIES_PATH'
+CLAIMS_PATH_VARIABLE = 'PORTFOLIO_CLAIMS_PATH'
+# Checkpoint of aggregates kept up to date by the CSV ingestion (csv_ingestion.py)
+CHECKPOINT_PATH_VARIABLE = 'PORTFOLIO_CHECKPOINT_PATH'
+
+AGGREGATE_FIELDS = ('exposure', 'num_policies', 'num_claims', 'claim_total', 'claim_sum_squares')
+
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, which is only needed to read Parquet / Arrow extracts
+    """
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("Reading Parquet or Arrow files requires pyarrow (pip install pyarrow)") from error
+
+    return pyarrow
+
+
+def iter_record_batches(path, columns, batch_size=1000000):
+    """
+    Yields record batches of the requested columns from a memory-mapped Parquet or Arrow IPC file
+
+    Only the projected columns are read, one batch at a time, so memory is bounded by the
+    batch size rather than the file size. Arrow IPC batches are zero-copy views of the map.
+
+    Parameters:
+    -----------
+    path : str
+        .parquet file, or Arrow IPC file / stream (.arrow, .feather, .ipc)
+    columns : list
+        Column names to read
+    batch_size : int
+        Rows per batch (Parquet)
+
+    Yields:
+    -------
+    pyarrow.RecordBatch
+        Batch with the requested columns
+    """
+    pa = _import_pyarrow()
+
+    if path.endswith('.parquet'):
+        parquet_file = pa.parquet.ParquetFile(path, memory_map=True)
+        yield from parquet_file.iter_batches(batch_size=batch_size, columns=list(columns))
+        return
+
+    with pa.memory_map(path, 'r') as source:
+        try:
+            reader = pa.ipc.open_file(source)
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        except pa.ArrowInvalid:
+            source.seek(0)
+            batches = pa.ipc.open_stream(source)
+
+        for batch in batches:
+            yield batch.select(list(columns))
+
+
+def empty_aggregates():
+    """
+    Per-cohort aggregates with no cohorts yet
+    """
+    aggregates = {'cohorts': []}
+    aggregates.update({field: np.zeros(0) for field in AGGREGATE_FIELDS})
+    return aggregates
+
+
+def cohort_ids(aggregates, cohort_values):
+    """
+    Maps an array of cohort labels to integer ids, adding unseen cohorts to the aggregates
+
+    Parameters:
+    -----------
+    aggregates : dict
+        Aggregates whose 'cohorts' list defines the ids (grown in place)
+    cohort_values : array_like
+        Cohort label of each row
+
+    Returns:
+    --------
+    numpy.ndarray
+        Cohort id of each row
+    """
+    labels, inverse = np.unique(np.asarray(cohort_values), return_inverse=True)
+
+    index = {cohort: i for i, cohort in enumerate(aggregates['cohorts'])}
+    for label in labels.tolist():
+        if label not in index:
+            index[label] = len(aggregates['cohorts'])
+            aggregates['cohorts'].append(label)
+
+    num_cohorts = len(aggregates['cohorts'])
+    for field in AGGREGATE_FIELDS:
+        aggregates[field] = np.pad(aggregates[field], (0, num_cohorts - len(aggregates[field])))
+
+    return np.array([index[label] for label in labels.tolist()], dtype=np.int64)[inverse.ravel()]
+
+
+def add_policies(aggregates, codes, exposures):
+    """
+    Adds policy rows (cohort id from cohort_ids(), exposure) to the per-cohort aggregates in place
+    """
+    num_cohorts = len(aggregates['cohorts'])
+    aggregates['exposure'] += np.bincount(codes, weights=np.asarray(exposures, dtype=float), minlength=num_cohorts)
+    aggregates['num_policies'] += np.bincount(codes, minlength=num_cohorts)
+    return aggregates
+
+
+def add_claims(aggregates, codes, amounts):
+    """
+    Adds claim rows (cohort id from cohort_ids(), claim amount) to the per-cohort aggregates in place
+    """
+    num_cohorts = len(aggregates['cohorts'])
+    amounts = np.asarray(amounts, dtype=float)
+    aggregates['num_claims'] += np.bincount(codes, minlength=num_cohorts)
+    aggregates['claim_total'] += np.bincount(codes, weights=amounts, minlength=num_cohorts)
+    aggregates['claim_sum_squares'] += np.bincount(codes, weights=amounts ** 2, minlength=num_cohorts)
+    return aggregates
+
+
+def _batch_columns(aggregates, batch, cohort_column, value_column):
+    """
+    Cohort ids and numeric values of a record batch as numpy arrays, skipping null rows
+    """
+    pa = _import_pyarrow()
+    cohorts = batch.column(cohort_column)
+    values = batch.column(value_column)
+
+    valid = pa.compute.and_(pa.compute.is_valid(cohorts), pa.compute.is_valid(values))
+    if valid.false_count:
+        cohorts = cohorts.filter(valid)
+        values = values.filter(valid)
+
+    # Dictionary-encode so only the distinct labels are converted to Python objects
+    encoded = pa.compute.dictionary_encode(cohorts)
+    codes = cohort_ids(aggregates, encoded.dictionary.to_pylist())[encoded.indices.to_numpy()]
+
+    return codes, values.to_numpy(zero_copy_only=False).astype(float, copy=False)
+
+
+def load_cohort_aggregates(policies_path, claims_path, cohort_column='cohort', exposure_column='exposure',
+                           amount_column='claim_amount', batch_size=1000000):
+    """
+    Computes per-cohort exposure, claim counts and claim amount sums from Parquet / Arrow extracts
+
+    Both files are scanned batch by batch with only the needed columns, so a 50M-row claims
+    file is never loaded as a whole table.
+
+    Parameters:
+    -----------
+    policies_path : str
+        Policy extract: one row per policy (or policy period) with cohort and exposure
+    claims_path : str
+        Claims extract: one row per claim with cohort and claim amount
+    cohort_column : str
+        Name of the cohort (risk class) column in both files
+    exposure_column : str
+        Name of the exposure column (policy years) in the policy file
+    amount_column : str
+        Name of the claim amount column in the claims file
+    batch_size : int
+        Rows per batch
+
+    Returns:
+    --------
+    aggregates : dict
+        'cohorts' (labels) and per-cohort arrays 'exposure', 'num_policies', 'num_claims',
+        'claim_total' and 'claim_sum_squares'
+    """
+    aggregates = empty_aggregates()
+
+    for batch in iter_record_batches(policies_path, [cohort_column, exposure_column], batch_size):
+        add_policies(aggregates, *_batch_columns(aggregates, batch, cohort_column, exposure_column))
+
+    for batch in iter_record_batches(claims_path, [cohort_column, amount_column], batch_size):
+        add_claims(aggregates, *_batch_columns(aggregates, batch, cohort_column, amount_column))
+
+    return aggregates
+
+
+def cohort_rates(aggregates):
+    """
+    Frequency, severity and severity spread per cohort from the aggregates
+
+    Parameters:
+    -----------
+    aggregates : dict
+        Output of load_cohort_aggregates() (or the CSV ingestion)
+
+    Returns:
+    --------
+    rates : dict
+        Per-cohort 'cohorts', 'exposure', 'frequency' (claims per policy year), 'severity'
+        (mean claim amount), 'severity_cv' and the matching lognormal 'severity_sigma'
+    """
+    num_claims = aggregates['num_claims']
+    has_claims = num_claims > 0
+    severity = np.divide(aggregates['claim_total'], num_claims, out=np.zeros(len(num_claims)), where=has_claims)
+    second_moment = np.divide(aggregates['claim_sum_squares'], num_claims, out=np.zeros(len(num_claims)),
+                              where=has_claims)
+    variance = np.maximum(second_moment - severity ** 2, 0.0)
+    severity_cv = np.divide(np.sqrt(variance), severity, out=np.zeros(len(num_claims)), where=severity > 0)
+
+    rates = {
+        'cohorts': list(aggregates['cohorts']),
+        'exposure': aggregates['exposure'],
+        'frequency': np.divide(num_claims, aggregates['exposure'], out=np.zeros(len(num_claims)),
+                               where=aggregates['exposure'] > 0),
+        'severity': severity,
+        'severity_cv': severity_cv,
+        'severity_sigma': np.sqrt(np.log1p(severity_cv ** 2))
+    }
+
+    return rates
+
+
+def cohort_table_from_aggregates(aggregates, num_drivers=200):
+    """
+    Builds a cohort table for the N-cohort driver engine from loaded aggregates
+
+    Cohorts without claims are left out.
+    """
+    rates = cohort_rates(aggregates)
+    keep = rates['severity'] > 0
+
+    return make_cohort_table(np.asarray(rates['cohorts'], dtype=str)[keep], rates['frequency'][keep],
+                             rates['severity'][keep], np.maximum(rates['severity_sigma'][keep], 0.01), num_drivers)
+
+
+def comparison_inputs(aggregates, first_cohort=None, second_cohort=None):
+    """
+    Loaded frequency and severity of two cohorts, in the form the driver and premium tabs use
+
+    Parameters:
+    -----------
+    aggregates : dict
+        Output of load_cohort_aggregates() (or the CSV ingestion)
+    first_cohort, second_cohort : str
+        Cohorts to compare. Default to the cohorts with the lowest and highest
+        expected loss per policy year
+
+    Returns:
+    --------
+    inputs : dict
+        'first_cohort' / 'second_cohort' names, their 'good_frequency', 'good_severity',
+        'bad_frequency', 'bad_severity', 'good_severity_sigma' and 'bad_severity_sigma'
+        (lognormal shape matching the claim amount CV), and the driver comparison arguments
+        'base_frequency', 'base_severity', 'bad_driver_freq_multiplier' and
+        'bad_driver_severity_multiplier'
+    """
+    rates = cohort_rates(aggregates)
+    cohorts = rates['cohorts']
+    expected_loss = rates['frequency'] * rates['severity']
+    candidates = np.flatnonzero(expected_loss > 0)
+    if len(candidates) == 0:
+        raise ValueError("No cohort has both exposure and claims")
+
+    first = (cohorts.index(first_cohort) if first_cohort is not None
+             else candidates[np.argmin(expected_loss[candidates])])
+    second = (cohorts.index(second_cohort) if second_cohort is not None
+              else candidates[np.argmax(expected_loss[candidates])])
+
+    inputs = {
+        'first_cohort': cohorts[first],
+        'second_cohort': cohorts[second],
+        'good_frequency': rates['frequency'][first],
+        'good_severity': rates['severity'][first],
+        'bad_frequency': rates['frequency'][second],
+        'bad_severity': rates['severity'][second],
+        'good_severity_sigma': rates['severity_sigma'][first],
+        'bad_severity_sigma': rates['severity_sigma'][second],
+        'base_frequency': rates['frequency'][first],
+        'base_severity': rates['severity'][first],
+        'bad_driver_freq_multiplier': rates['frequency'][second] / rates['frequency'][first],
+        'bad_driver_severity_multiplier': rates['severity'][second] / rates['severity'][first]
+    }
+
+    return inputs
+
+
+def load_configured_portfolio():
+    """
+    Loads the extracts named by PORTFOLIO_POLICIES_PATH / PORTFOLIO_CLAIMS_PATH, if both are set,
+    or else the CSV ingestion checkpoint named by PORTFOLIO_CHECKPOINT_PATH
+
+    Returns:
+    --------
+    aggregates : dict or None
+        Per-cohort aggregates, or None when the app should keep using simulated data
+    """
+    policies_path = os.environ.get(POLICIES_PATH_VARIABLE)
+    claims_path = os.environ.get(CLAIMS_PATH_VARIABLE)
+    checkpoint_path = os.environ.get(CHECKPOINT_PATH_VARIABLE)
+
+    if policies_path and claims_path:
+        return load_cohort_aggregates(policies_path, claims_path)
+
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        # Imported here because csv_ingestion builds on this module
+        from modules.csv_ingestion import read_checkpoint
+        aggregates, _ = read_checkpoint(checkpoint_path)
+        return aggregates
+
+    return None
@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -6,11 +7,209 @@ import os
 from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from matplotlib.gridspec import GridSpec
 
+# Default loadings, as shares of the premium
+EXPENSE_RATIO = 0.25
+RISK_MARGIN_RATIO = 0.05
+
+# 'ratio' loads a fixed share of premium; 'cost_of_capital' charges COST_OF_CAPITAL_RATE on
+# the capital a cohort of COHORT_SIZE policies needs (VaR at CAPITAL_LEVEL minus the mean)
+RISK_MARGIN_MODES = ('ratio', 'cost_of_capital')
+COST_OF_CAPITAL_RATE = 0.06
+CAPITAL_LEVEL = 0.995
+COHORT_SIZE = 1000
+
+
+def rate_policies(frequency, severity=None, expense_ratio=EXPENSE_RATIO, risk_margin_ratio=RISK_MARGIN_RATIO,
+                  risk_margin=None):
+    """
+    Premium components for any number of policies in one vectorized call
+
+    Premium = Expected Loss + Expense Ratio x Premium + Risk Margin x Premium, so
+    Premium = Expected Loss / (1 - Expense Ratio - Risk Margin). With a risk margin
+    in dollars, Premium = (Expected Loss + Risk Margin) / (1 - Expense Ratio). All
+    inputs broadcast against each other, so loadings can be scalars or per-policy arrays.
+
+    Parameters:
+    -----------
+    frequency : array_like or dict / pandas.DataFrame
+        Accident frequency of each policy, or a columnar table with 'frequency' and
+        'severity' columns and optional 'expense_ratio' / 'risk_margin_ratio' columns
+    severity : array_like
+        Average claim amount of each policy (taken from the table if frequency is one)
+    expense_ratio : float or array_like
+        Expenses as a share of premium
+    risk_margin_ratio : float or array_like
+        Risk margin as a share of premium
+    risk_margin : float or array_like
+        Risk margin in dollars per policy (e.g. from cost_of_capital_margin()),
+        replacing risk_margin_ratio
+
+    Returns:
+    --------
+    components : dict
+        'expected_loss', 'expenses', 'risk_margin', 'premium' and 'loading_factor'
+        (premium / expected loss) arrays
+    """
+    if severity is None:
+        table = frequency
+        frequency, severity = table['frequency'], table['severity']
+        if 'expense_ratio' in table:
+            expense_ratio = table['expense_ratio']
+        if 'risk_margin_ratio' in table:
+            risk_margin_ratio = table['risk_margin_ratio']
+
+    expense_ratio = np.asarray(expense_ratio, dtype=float)
+    expected_loss = np.asarray(frequency, dtype=float) * np.asarray(severity, dtype=float)
+
+    if risk_margin is not None:
+        if np.any(expense_ratio >= 1):
+            raise ValueError("expense_ratio must be below 1")
+        risk_margin = np.asarray(risk_margin, dtype=float)
+        premium = (expected_loss + risk_margin) / (1 - expense_ratio)
+        loading_factor = np.divide(premium, expected_loss, out=np.full(premium.shape, np.nan),
+                                   where=expected_loss > 0)
+    else:
+        risk_margin_ratio = np.asarray(risk_margin_ratio, dtype=float)
+        retained = 1 - expense_ratio - risk_margin_ratio
+        if np.any(retained <= 0):
+            raise ValueError("expense_ratio + risk_margin_ratio must be below 1")
+        loading_factor = 1 / retained
+        premium = expected_loss * loading_factor
+        risk_margin = premium * risk_margin_ratio
+
+    components = {
+        'expected_loss': expected_loss,
+        'expenses': premium * expense_ratio,
+        'risk_margin': np.broadcast_to(risk_margin, premium.shape),
+        'premium': premium,
+        'loading_factor': np.broadcast_to(loading_factor, premium.shape)
+    }
+
+    return components
+
+
+@functools.lru_cache(maxsize=256)
+def cohort_capital(frequency, severity, severity_sigma=0.4, num_policies=COHORT_SIZE, level=CAPITAL_LEVEL):
+    """
+    Capital a cohort needs: VaR of its annual aggregate loss at the level, minus the mean
+
+    The aggregate loss (Poisson claim counts, lognormal claim amounts) is computed by
+    FFT. Results are memoised on the exact argument values. The app passes the driver
+    comparison's simulated averages, so the cache hits when a render repeats the same
+    sliders and seed (e.g. switching tabs or the margin mode back and forth), not across
+    re-simulations or nearby slider values.
+
+    Parameters:
+    -----------
+    frequency : float
+        Expected claims per policy per year
+    severity : float
+        Average claim amount
+    severity_sigma : float
+        Lognormal shape parameter of the claim amounts
+    num_policies : int
+        Policies in the cohort
+    level : float
+        Confidence level of the VaR
+
+    Returns:
+    --------
+    tuple
+        (mean, VaR, capital) of the cohort's aggregate loss in dollars
+    """
+    # Imported here to keep SciPy off the app's import path until this mode is used
+    from modules.aggregate_loss import lognormal_aggregate_loss, lognormal_severity_parameters
+
+    mu = lognormal_severity_parameters(severity, severity_sigma)
+    stats = lognormal_aggregate_loss(mu, severity_sigma, expected_claims=num_policies * frequency, levels=(level,))
+    value_at_risk = float(stats['var'][level])
+
+    return float(stats['mean']), value_at_risk, value_at_risk - float(stats['mean'])
+
+
+def cost_of_capital_margin(frequency, severity, severity_sigma=0.4, num_policies=COHORT_SIZE,
+                           cost_of_capital_rate=COST_OF_CAPITAL_RATE, level=CAPITAL_LEVEL):
+    """
+    Risk margin per policy: the cost of holding the cohort's capital, shared by its policies
+
+    Parameters:
+    -----------
+    frequency, severity, severity_sigma, num_policies, level :
+        Cohort parameters, see cohort_capital()
+    cost_of_capital_rate : float
+        Annual return required on the capital
+
+    Returns:
+    --------
+    float
+        Risk margin in dollars per policy
+    """
+    _, _, capital = cohort_capital(float(frequency), float(severity), float(severity_sigma), int(num_policies),
+                                   float(level))
+    return cost_of_capital_rate * capital / num_policies
+
+
+def premium_sensitivity(frequency, severity, expense_ratio=EXPENSE_RATIO,
+                        risk_margin_ratio=RISK_MARGIN_RATIO, steps=None, risk_margin_mode='ratio',
+                        severity_sigma=0.4, num_policies=COHORT_SIZE, cost_of_capital_rate=COST_OF_CAPITAL_RATE):
+    """
+    What-if changes in premium when each input moves by a fixed step, from rate_policies()
+
+    In 'cost_of_capital' mode the margin is re-sized with cost_of_capital_margin() at
+    every shifted point, so frequency and severity steps also move the capital charge.
+
+    Parameters:
+    -----------
+    frequency, severity, expense_ratio, risk_margin_ratio : float or array_like
+        Point(s) to evaluate (risk_margin_ratio is only used in 'ratio' mode)
+    steps : dict
+        Input name -> step. Defaults to 1 point of frequency, $1,000 of severity and
+        1 point of each loading (no risk margin step in 'cost_of_capital' mode)
+    risk_margin_mode : str
+        'ratio' or 'cost_of_capital', see demonstrate_premium_calculation()
+    severity_sigma, num_policies, cost_of_capital_rate : float or array_like
+        Cohort parameters of the capital ('cost_of_capital' mode), see cost_of_capital_margin()
+
+    Returns:
+    --------
+    changes : dict
+        Input name -> premium change for a step up in that input
+    """
+    if risk_margin_mode not in RISK_MARGIN_MODES:
+        raise ValueError(f"risk_margin_mode must be one of {RISK_MARGIN_MODES}, got {risk_margin_mode!r}")
+    if steps is None:
+        steps = {'frequency': 0.01, 'severity': 1000.0, 'expense_ratio': 0.01, 'risk_margin_ratio': 0.01}
+        if risk_margin_mode == 'cost_of_capital':
+            del steps['risk_margin_ratio']
+
+    def premium_at(point):
+        if risk_margin_mode == 'ratio':
+            return rate_policies(**point)['premium']
+        cohorts = np.broadcast_arrays(point['frequency'], point['severity'], severity_sigma, num_policies)
+        margins = [cost_of_capital_margin(*cohort, cost_of_capital_rate=cost_of_capital_rate)
+                   for cohort in zip(*(values.ravel() for values in cohorts))]
+        return rate_policies(point['frequency'], point['severity'], point['expense_ratio'],
+                             risk_margin=np.reshape(margins, cohorts[0].shape))['premium']
+
+    point = {'frequency': frequency, 'severity': severity, 'expense_ratio': expense_ratio,
+             'risk_margin_ratio': risk_margin_ratio}
+    premium = premium_at(point)
+
+    changes = {}
+    for name, step in steps.items():
+        shifted = dict(point, **{name: np.add(point[name], step)})
+        changes[name] = premium_at(shifted) - premium
+
+    return changes
+
 
 def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000, return_fig=False,
                                     good_driver_image="drake.jpeg",
                                     bad_driver_freq=0.15, bad_driver_severity=16000,
-                                    is_mobile=False):
+                                    is_mobile=False, expense_ratio=EXPENSE_RATIO, risk_margin_ratio=RISK_MARGIN_RATIO,
+                                    risk_margin_mode='ratio', severity_sigma=0.4, bad_driver_severity_sigma=0.4,
+                                    cost_of_capital_rate=COST_OF_CAPITAL_RATE, cohort_size=COHORT_SIZE,
+                                    cohort_names=None):
     """
     Demonstrates how insurance premiums are calculated
 
@@ -30,6 +229,24 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
         Bad driver claim severity (for comparison)
     is_mobile : bool
         Whether to use mobile-optimized visualization
+    expense_ratio : float
+        Expenses as a share of premium
+    risk_margin_ratio : float
+        Risk margin as a share of premium ('ratio' mode)
+    risk_margin_mode : str
+        'ratio' (fixed share of premium) or 'cost_of_capital' (cost of the capital each
+        cohort needs, see cost_of_capital_margin())
+    severity_sigma : float
+        Lognormal shape of the good driver cohort's claim amounts ('cost_of_capital' mode)
+    bad_driver_severity_sigma : float
+        Lognormal shape of the bad driver cohort's claim amounts ('cost_of_capital' mode)
+    cost_of_capital_rate : float
+        Annual return required on capital ('cost_of_capital' mode)
+    cohort_size : int
+        Policies per cohort when sizing capital ('cost_of_capital' mode)
+    cohort_names : tuple
+        (first, second) cohort names replacing the driver-based ones, e.g. loaded portfolio
+        cohorts (the driver images are then left out)
 
     Returns:
     --------
@@ -62,30 +279,34 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
     bad_driver_name = "Kendrick" if good_driver_name == "Drake" else "Drake"
 
     # Use specific cohort names
-    first_cohort_name = f"{good_driver_name} Cohort"
-    second_cohort_name = f"{bad_driver_name} Cohort"
-
-    # Calculate components for good driver
-    expected_loss_good = accident_frequency * claim_severity
-    expense_ratio = 0.25  # Fixed at 25% of premium
-    risk_margin_ratio = 0.05  # Fixed at 5% of premium
-
-    # Premium components (solving the equation)
-    # Premium = Expected Loss + Expense Ratio × Premium + Risk Margin × Premium
-    # Premium = Expected Loss / (1 - Expense Ratio - Risk Margin)
-    premium_good = expected_loss_good / (1 - expense_ratio - risk_margin_ratio)
-    expenses_good = premium_good * expense_ratio
-    risk_margin_good = premium_good * risk_margin_ratio
-
-    # Calculate components for bad driver
-    expected_loss_bad = bad_driver_freq * bad_driver_severity
-    premium_bad = expected_loss_bad / (1 - expense_ratio - risk_margin_ratio)
-    expenses_bad = premium_bad * expense_ratio
-    risk_margin_bad = premium_bad * risk_margin_ratio
-
-    # Loading factor
-    loading_factor_good = premium_good / expected_loss_good
-    loading_factor_bad = premium_bad / expected_loss_bad
+    if cohort_names is not None:
+        first_cohort_name, second_cohort_name = cohort_names
+        first_title, second_title = cohort_names
+    else:
+        first_cohort_name = f"{good_driver_name} Cohort"
+        second_cohort_name = f"{bad_driver_name} Cohort"
+        first_title, second_title = good_driver_name, bad_driver_name
+
+    if risk_margin_mode not in RISK_MARGIN_MODES:
+        raise ValueError(f"risk_margin_mode must be one of {RISK_MARGIN_MODES}, got {risk_margin_mode!r}")
+
+    # Cost-of-capital margins come from each cohort's aggregate loss distribution (memoised)
+    risk_margin = None
+    if risk_margin_mode == 'cost_of_capital':
+        risk_margin = [cost_of_capital_margin(accident_frequency, claim_severity, severity_sigma, cohort_size,
+                                              cost_of_capital_rate),
+                       cost_of_capital_margin(bad_driver_freq, bad_driver_severity, bad_driver_severity_sigma,
+                                              cohort_size, cost_of_capital_rate)]
+
+    # Both cohorts are priced in one rate_policies() call
+    rates = rate_policies([accident_frequency, bad_driver_freq], [claim_severity, bad_driver_severity],
+                          expense_ratio, risk_margin_ratio, risk_margin)
+    expected_loss_good, expected_loss_bad = rates['expected_loss']
+    expenses_good, expenses_bad = rates['expenses']
+    risk_margin_good, risk_margin_bad = rates['risk_margin']
+    premium_good, premium_bad = rates['premium']
+    loading_factor_good, loading_factor_bad = rates['loading_factor']
+    risk_margin_ratio_good, risk_margin_ratio_bad = rates['risk_margin'] / rates['premium']
 
     # For Shiny integration
     if return_fig:
@@ -139,7 +360,7 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
 
         # Adjust title and make more prominent for mobile
         if is_mobile:
-            ax1.set_title(f'{good_driver_name} Premium', fontsize=18, fontweight='bold')
+            ax1.set_title(f'{first_title} Premium', fontsize=18, fontweight='bold')
         else:
             ax1.set_title(f'{first_cohort_name} Premium Components', fontsize=14)
 
@@ -191,7 +412,7 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
 
         # Adjust title for mobile
         if is_mobile:
-            ax2.set_title(f'{bad_driver_name} Premium', fontsize=18, fontweight='bold')
+            ax2.set_title(f'{second_title} Premium', fontsize=18, fontweight='bold')
         else:
             ax2.set_title(f'{second_cohort_name} Premium Components', fontsize=14)
 
@@ -269,7 +490,7 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
 
         # Adjust title for mobile
         if is_mobile:
-            ax3.set_title(f'{good_driver_name}: ${premium_good:,.0f}', fontsize=16, fontweight='bold')
+            ax3.set_title(f'{first_title}: ${premium_good:,.0f}', fontsize=16, fontweight='bold')
         else:
             ax3.set_title(f'{first_cohort_name} Premium: ${premium_good:,.2f}', fontsize=12)
 
@@ -304,7 +525,7 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
 
         # Adjust title for mobile
         if is_mobile:
-            ax4.set_title(f'{bad_driver_name}: ${premium_bad:,.0f}', fontsize=16, fontweight='bold')
+            ax4.set_title(f'{second_title}: ${premium_bad:,.0f}', fontsize=16, fontweight='bold')
         else:
             ax4.set_title(f'{second_cohort_name} Premium: ${premium_bad:,.2f}', fontsize=12)
 
@@ -332,13 +553,13 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
                      ha='center', va='top', fontsize=11,
                      color='white', bbox=props)
 
-        # Try to add rapper images inside the bar charts (adjust size for mobile)
+        # Try to add rapper images inside the bar charts (adjust size for mobile; loaded cohorts have none)
         try:
             # Determine image paths
             good_image_path = os.path.join("modules", good_driver_image)
             bad_image_path = os.path.join("modules", f"{bad_driver_name.lower()}.jpeg")
 
-            if os.path.exists(good_image_path) and os.path.exists(bad_image_path):
+            if cohort_names is None and os.path.exists(good_image_path) and os.path.exists(bad_image_path):
                 # Image zoom factor - larger for mobile
                 zoom_factor = 0.35 if is_mobile else 0.40
 
@@ -371,17 +592,23 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
                                         pad=0.2,
                                         bboxprops=dict(facecolor='white', alpha=0.8, boxstyle='round'))
                 ax2.add_artist(ab_bad)
-            else:
+            elif cohort_names is None:
                 print(f"Warning: Image file not found. Looking for: {good_image_path} and {bad_image_path}")
         except Exception as e:
             print(f"Error adding images: {e}")
 
         # Create formula text box - simplified for mobile
         if is_mobile:
-            formula_text = f"Premium = Loss / (1 - Expense% - Risk%)\n" \
-                           f"• Loss = Frequency × Severity\n" \
-                           f"• Expense = {expense_ratio:.0%}\n" \
-                           f"• Risk = {risk_margin_ratio:.0%}"
+            if risk_margin_mode == 'cost_of_capital':
+                formula_text = f"Premium = (Loss + Risk) / (1 - Expense%)\n" \
+                               f"• Loss = Frequency × Severity\n" \
+                               f"• Expense = {expense_ratio:.0%}\n" \
+                               f"• Risk = {cost_of_capital_rate:.0%} × capital ({CAPITAL_LEVEL:.1%} VaR)"
+            else:
+                formula_text = f"Premium = Loss / (1 - Expense% - Risk%)\n" \
+                               f"• Loss = Frequency × Severity\n" \
+                               f"• Expense = {expense_ratio:.0%}\n" \
+                               f"• Risk = {risk_margin_ratio:.0%}"
 
             # Box styling for mobile
             props = dict(boxstyle='round', facecolor='#F8F9FA', ec='#BDC3C7', alpha=0.9)
@@ -391,12 +618,21 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
                      ha='center', va='center', fontweight='bold',
                      bbox=props)
         else:
-            formula_text = f"Premium Calculation Formula:\n\n" \
-                           f"Premium = Expected Loss / (1 - Expense% - Risk%)\n\n" \
-                           f"Where:\n" \
-                           f"• Expected Loss = Frequency × Severity\n" \
-                           f"• Expense Ratio = {expense_ratio:.0%}\n" \
-                           f"• Risk Margin = {risk_margin_ratio:.0%}"
+            if risk_margin_mode == 'cost_of_capital':
+                formula_text = f"Premium Calculation Formula:\n\n" \
+                               f"Premium = (Expected Loss + Risk Margin) / (1 - Expense%)\n\n" \
+                               f"Where:\n" \
+                               f"• Expected Loss = Frequency × Severity\n" \
+                               f"• Expense Ratio = {expense_ratio:.0%}\n" \
+                               f"• Risk Margin = {cost_of_capital_rate:.0%} cost of capital × "\
+                               f"({CAPITAL_LEVEL:.1%} VaR - mean) of a {cohort_size:,}-policy cohort, per policy"
+            else:
+                formula_text = f"Premium Calculation Formula:\n\n" \
+                               f"Premium = Expected Loss / (1 - Expense% - Risk%)\n\n" \
+                               f"Where:\n" \
+                               f"• Expected Loss = Frequency × Severity\n" \
+                               f"• Expense Ratio = {expense_ratio:.0%}\n" \
+                               f"• Risk Margin = {risk_margin_ratio:.0%}"
 
             # Original position for desktop
             props = dict(boxstyle='round', facecolor='#F2F4F4', ec='#BDC3C7', alpha=0.9)
@@ -422,6 +658,14 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
             'risk_margin_bad': risk_margin_bad,
             'premium_bad': premium_bad,
             'loading_factor_bad': loading_factor_bad,
+            'expense_ratio': expense_ratio,
+            'risk_margin_ratio': risk_margin_ratio_good,
+            'risk_margin_ratio_bad': risk_margin_ratio_bad,
+            'risk_margin_mode': risk_margin_mode,
+            'severity_sigma': severity_sigma,
+            'severity_sigma_bad': bad_driver_severity_sigma,
+            'cost_of_capital_rate': cost_of_capital_rate,
+            'cohort_size': cohort_size,
             'good_driver_image': good_driver_image,
             'good_driver_name': good_driver_name,
             'bad_driver_name': bad_driver_name,
@@ -449,7 +693,7 @@ def demonstrate_premium_calculation(accident_frequency=0.05, claim_severity=8000
         print(
             f"• {first_cohort_name} Expenses: ${expenses_good:.2f} ({expense_ratio:.0%} of premium for administration, commissions, etc.)")
         print(
-            f"• {first_cohort_name} Risk Margin: ${risk_margin_good:.2f} ({risk_margin_ratio:.0%} of premium for profit and uncertainty)")
+            f"• {first_cohort_name} Risk Margin: ${risk_margin_good:.2f} ({risk_margin_ratio_good:.0%} of premium for profit and uncertainty)")
         print(f"• {first_cohort_name} Final Premium: ${premium_good:.2f}")
         print(f"• {second_cohort_name} Final Premium: ${premium_bad:.2f}")
         print("\nThis is the base premium before applying individual rating factors like age, driving history, etc.")
\ No newline at end of file
@@ -0,0 +1,182 @@
+import numpy as np
+from modules.glm import RATING_LEVELS, rating_variable_ids
+from modules.premium_calculation import rate_policies
+
+
+def make_rating_tables(base_rate=None, variables=None, base_frequency=0.05, base_severity=8000):
+    """
+    Base rate and one factor table per rating variable
+
+    Default factors are the RATING_LEVELS frequency x severity relativities, so the
+    base level of every variable has factor 1.
+
+    Parameters:
+    -----------
+    base_rate : float
+        Premium at the base level of every variable. Defaults to the rate_policies()
+        premium of base_frequency and base_severity
+    variables : list
+        Rating variable ids. Defaults to the acceptable variables of the ethics tab
+    base_frequency : float
+        Accident frequency at the base levels (used for the default base rate)
+    base_severity : float
+        Average claim amount at the base levels (used for the default base rate)
+
+    Returns:
+    --------
+    tables : dict
+        'base_rate', 'variables' and per-variable 'levels' and 'factors' lists
+    """
+    if base_rate is None:
+        base_rate = float(rate_policies(base_frequency, base_severity)['premium'])
+    if variables is None:
+        variables = rating_variable_ids()
+
+    tables = {
+        'base_rate': base_rate,
+        'variables': list(variables),
+        'levels': {name: list(RATING_LEVELS[name]['levels']) for name in variables},
+        'factors': {name: [frequency * severity for frequency, severity
+                           in zip(RATING_LEVELS[name]['frequency'], RATING_LEVELS[name]['severity'])]
+                    for name in variables}
+    }
+
+    return tables
+
+
+def rating_tables_from_glm(fits, num_levels, base_rate=None):
+    """
+    Factor tables from fitted frequency and severity GLMs (see glm.fit_rating_glms)
+
+    Each factor is the product of the fitted frequency and severity relativities of
+    the level; the base rate defaults to the product of the fitted intercepts, loaded
+    with the default expense and risk margin ratios.
+
+    Parameters:
+    -----------
+    fits : dict
+        'frequency' and 'severity' fit_glm() results with column names
+    num_levels : dict
+        Variable name -> number of levels
+    base_rate : float
+        Premium at the base levels, overriding the fitted one
+
+    Returns:
+    --------
+    tables : dict
+        See make_rating_tables()
+    """
+    variables = list(num_levels)
+    factors = {name: np.ones(num_levels[name]) for name in variables}
+
+    for model in ('frequency', 'severity'):
+        relativities = fits[model]['relativities']
+        for (name, level), relativity in zip(fits[model]['column_names'], relativities):
+            if name != 'intercept':
+                factors[name][level] *= relativity
+
+    if base_rate is None:
+        intercepts = fits['frequency']['relativities'][0], fits['severity']['relativities'][0]
+        base_rate = float(rate_policies(*intercepts)['premium'])
+
+    tables = {
+        'base_rate': base_rate,
+        'variables': variables,
+        'levels': {name: list(RATING_LEVELS[name]['levels']) if name in RATING_LEVELS
+                   else list(range(num_levels[name])) for name in variables},
+        'factors': {name: factors[name].tolist() for name in variables}
+    }
+
+    return tables
+
+
+def compile_rating_tables(tables, dtype=np.float64):
+    """
+    Compiles factor tables into integer-coded lookup arrays for quote_policies()
+
+    Parameters:
+    -----------
+    tables : dict
+        Output of make_rating_tables() or rating_tables_from_glm()
+    dtype : numpy dtype
+        Dtype of the lookup arrays and quotes
+
+    Returns:
+    --------
+    compiled : dict
+        'base_rate', 'variables', 'lookups' (variable -> factor array indexed by level
+        code) and 'codes' (variable -> level label -> code)
+    """
+    compiled = {
+        'base_rate': tables['base_rate'],
+        'variables': list(tables['variables']),
+        'lookups': {name: np.asarray(tables['factors'][name], dtype=dtype) for name in tables['variables']},
+        'codes': {name: {level: code for code, level in enumerate(tables['levels'][name])}
+                  for name in tables['variables']}
+    }
+
+    return compiled
+
+
+def encode_levels(compiled, variable, labels):
+    """
+    Level codes of an array of level labels (e.g. 'SUV'), looking up each distinct label once
+
+    Parameters:
+    -----------
+    compiled : dict
+        Output of compile_rating_tables()
+    variable : str
+        Rating variable id
+    labels : array_like
+        Level label of each policy
+
+    Returns:
+    --------
+    numpy.ndarray
+        int8 level code of each policy
+    """
+    distinct, inverse = np.unique(np.asarray(labels), return_inverse=True)
+    level_codes = compiled['codes'][variable]
+
+    unknown = [label for label in distinct.tolist() if label not in level_codes]
+    if unknown:
+        raise ValueError(f"Unknown levels for {variable}: {unknown}")
+
+    return np.array([level_codes[label] for label in distinct.tolist()], dtype=np.int8)[inverse.ravel()]
+
+
+def quote_policies(compiled, codes, out=None):
+    """
+    Premium of every policy: base rate times the factor of each rating variable
+
+    One np.take gather per variable into a reused buffer, multiplied in place, so
+    quoting allocates only the result and one buffer.
+
+    Parameters:
+    -----------
+    compiled : dict
+        Output of compile_rating_tables()
+    codes : dict
+        Variable id -> integer level code of each policy (e.g. simulate_rating_portfolio codes)
+    out : numpy.ndarray
+        Optional array to write the premiums into
+
+    Returns:
+    --------
+    numpy.ndarray
+        Premium of each policy
+    """
+    variables = compiled['variables']
+    num_policies = len(codes[variables[0]])
+    dtype = compiled['lookups'][variables[0]].dtype
+
+    premium = np.empty(num_policies, dtype=dtype) if out is None else out
+    premium.fill(compiled['base_rate'])
+    factor = np.empty(num_policies, dtype=dtype)
+
+    for name in variables:
+        np.take(compiled['lookups'][name], codes[name], out=factor)
+        premium *= factor
+
+    return premium
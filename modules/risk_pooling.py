@@ -3,10 +3,19 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from matplotlib.figure import Figure
 import matplotlib.gridspec as gridspec
+from statistics import NormalDist
+from modules.sampling import make_generator
+
+# Fixed claim amount at $20,000
+CLAIM_AMOUNT = 20000
+
+# NumPy's hypergeometric sampler requires both population counts below this
+HYPERGEOMETRIC_LIMIT = 10 ** 9
 
 
 def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, seed=42, return_fig=False,
-                             is_mobile=False):
+                             is_mobile=False, aggregate_only=False, dependence='independent',
+                             correlation=0.0, **dependence_args):
     """
     Demonstrates the concept of risk pooling in insurance
 
@@ -16,12 +25,24 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
         The probability of an accident
     num_policyholders : int
         The number of policyholders
-    seed : int
+    seed : int or numpy.random.Generator
         Random seed for reproducibility
     return_fig : bool
         If True, returns the figure and stats for Shiny integration
     is_mobile : bool
         Whether to use mobile-optimized visualization
+    aggregate_only : bool
+        If True, draws the claim count directly from a binomial distribution and only
+        samples the displayed individuals, so memory and time do not grow with the pool size
+    dependence : str
+        'independent', or a correlated mode: 'common_shock', 'gaussian' or 't' (copula).
+        The simulated year draws one common factor that moves every policyholder's
+        claim probability, see modules.correlated_risk
+    correlation : float
+        Latent correlation between policyholders (copula modes)
+    **dependence_args :
+        Extra parameters for the correlated modes (degrees_of_freedom, shock_probability,
+        shock_multiplier)
 
     Returns:
     --------
@@ -49,24 +70,46 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
                 color=['#3498DB', '#2ECC71', '#E74C3C', '#9B59B6', '#F39C12', '#1ABC9C']),
         })
 
-    # Fixed claim amount at $20,000
-    CLAIM_AMOUNT = 20000
+    # Isolated random stream for consistent results
+    rng = make_generator(seed)
+
+    # Number of individual outcomes shown in the plots
+    display_n = min(50, num_policyholders)
 
-    # Set random seed for consistent results
-    np.random.seed(seed)
+    # Claim probability in the simulated year; correlated modes move it for everyone at once
+    year_probability = accident_probability
+    if dependence != 'independent':
+        from modules.correlated_risk import scenario_claim_probabilities
+        year_probability = scenario_claim_probabilities(rng, accident_probability, 1, dependence, correlation,
+                                                        **dependence_args)[0]
 
-    # Run the simulation - generate random accidents
-    accidents = np.random.random(num_policyholders) < accident_probability
+    if aggregate_only:
+        # Draw the total claim count directly - no per-policyholder arrays
+        num_with_loss = rng.binomial(num_policyholders, year_probability)
+
+        # Claims among the displayed policyholders, conditional on the pool total. NumPy's
+        # hypergeometric needs both counts below 1e9; at that size drawing at most 50 without
+        # replacement is indistinguishable from drawing with replacement
+        if max(num_with_loss, num_policyholders - num_with_loss) < HYPERGEOMETRIC_LIMIT:
+            display_claims = rng.hypergeometric(num_with_loss, num_policyholders - num_with_loss, display_n)
+        else:
+            display_claims = rng.binomial(display_n, num_with_loss / num_policyholders)
+        display_accidents = np.zeros(display_n, dtype=bool)
+        display_accidents[rng.permutation(display_n)[:display_claims]] = True
+    else:
+        # Run the simulation - generate random accidents
+        accidents = rng.random(num_policyholders) < year_probability
+        num_with_loss = np.sum(accidents)
+        display_accidents = accidents[:display_n]
 
     # Calculate results
-    individual_costs = np.where(accidents, CLAIM_AMOUNT, 0)
-    total_losses = np.sum(individual_costs)
+    display_costs = np.where(display_accidents, CLAIM_AMOUNT, 0)
+    total_losses = num_with_loss * CLAIM_AMOUNT
     fair_premium = accident_probability * CLAIM_AMOUNT
     pool_premium_total = fair_premium * num_policyholders
 
     # Calculate stats
-    num_with_loss = np.sum(accidents)
-    percent_with_loss = np.mean(accidents) * 100
+    percent_with_loss = num_with_loss / num_policyholders * 100
     pool_performance = total_losses / pool_premium_total
 
     # For Shiny integration
@@ -99,15 +142,12 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
                 label='Potential loss amount'
             )
 
-            # Number of policyholders to display (limit for better mobile visualization)
-            display_n = min(50, num_policyholders)
-
             # Overlay scatter plot showing actual outcomes - CRITICAL RESTORED ELEMENT
             x_positions = np.ones(display_n) * 0  # All points at x=0 ("Without Insurance")
-            y_positions = individual_costs[:display_n]  # Each person's actual outcome
+            y_positions = display_costs  # Each person's actual outcome
 
             # Add jitter to x positions for better visualization
-            x_jitter = np.random.uniform(-0.2, 0.2, size=display_n)
+            x_jitter = rng.uniform(-0.2, 0.2, size=display_n)
             x_positions += x_jitter
 
             # Plot the actual outcomes as scatter points - RESTORED
@@ -263,9 +303,6 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
             ax1 = fig.add_subplot(121)
             ax2 = fig.add_subplot(122)
 
-            # Use more points for display on desktop
-            display_n = min(50, num_policyholders)
-
             # Plot 1: Individual outcomes with improved visualization
             # Blue bar chart for individual outcomes
             ax1.bar(
@@ -279,10 +316,10 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
 
             # Overlay scatter plot showing actual outcomes
             x_positions = np.ones(display_n) * 0  # All points at x=0 ("Without Insurance")
-            y_positions = individual_costs[:display_n]  # Each person's actual outcome
+            y_positions = display_costs  # Each person's actual outcome
 
             # Add jitter to x positions for better visualization
-            x_jitter = np.random.uniform(-0.2, 0.2, size=display_n)
+            x_jitter = rng.uniform(-0.2, 0.2, size=display_n)
             x_positions += x_jitter
 
             # Plot the actual outcomes as scatter points
@@ -402,4 +439,232 @@ def demonstrate_risk_pooling(accident_probability=0.05, num_policyholders=100, s
         print(
             f"• Without Insurance: {num_with_loss} people ({percent_with_loss:.1f}%) faced a ${CLAIM_AMOUNT:,.0f} loss.")
         print(f"• With Insurance: Everyone pays a premium of ${fair_premium:.0f}.")
-        print(f"• Risk Pooling Result: The insurer collected ${pool_premium_total:,.0f} and paid ${total_losses:,.0f}.")
\ No newline at end of file
+        print(f"• Risk Pooling Result: The insurer collected ${pool_premium_total:,.0f} and paid ${total_losses:,.0f}.")
+
+
+def simulate_surplus_paths(accident_probability=0.05, num_policyholders=100, num_paths=10000, num_years=50,
+                           initial_capital=None, premium_loading=0.05, seed=42,
+                           percentiles=(5, 25, 50, 75, 95)):
+    """
+    Simulates many independent multi-year paths of the insurance pool's surplus
+
+    Every path starts with the same capital, collects the same premium each year and
+    pays that year's claims. All paths and years are drawn in one batched binomial call,
+    so the cost does not depend on the number of policyholders.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident for each policyholder per year
+    num_policyholders : int
+        The number of policyholders in the pool
+    num_paths : int
+        The number of independent pool histories to simulate
+    num_years : int
+        The number of years in each history
+    initial_capital : float
+        Starting surplus. Defaults to the 99% one-year buffer used for the pool plot
+        (2.576 standard deviations of annual losses)
+    premium_loading : float
+        Premium loading on top of the fair premium (0.05 = 5%)
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    percentiles : tuple
+        Surplus percentiles to report for every year
+
+    Returns:
+    --------
+    stats : dict
+        Ruin probability, time-to-ruin distribution and surplus percentiles
+    """
+    rng = make_generator(seed)
+
+    p = accident_probability
+    n = num_policyholders
+
+    # Default capital covers a 1-in-100 year of losses above expectation
+    if initial_capital is None:
+        initial_capital = 2.576 * np.sqrt(n * p * (1 - p)) * CLAIM_AMOUNT
+
+    premium_per_year = (1 + premium_loading) * p * CLAIM_AMOUNT * n
+
+    # Claims for every path and year in one draw - shape (num_paths, num_years)
+    annual_claims = rng.binomial(n, p, size=(num_paths, num_years)) * float(CLAIM_AMOUNT)
+
+    # Surplus process: capital + premiums - claims, accumulated over the years
+    surplus = premium_per_year - annual_claims
+    np.cumsum(surplus, axis=1, out=surplus)
+    surplus += initial_capital
+
+    # Ruin is the first year the surplus drops below zero
+    below_zero = surplus < 0
+    ruined = below_zero.any(axis=1)
+    ruin_year = np.argmax(below_zero, axis=1) + 1
+
+    ruin_time_counts = np.bincount(ruin_year[ruined], minlength=num_years + 1)[1:]
+    ruin_time_pmf = ruin_time_counts / num_paths
+
+    if ruined.any():
+        mean_time_to_ruin = ruin_year[ruined].mean()
+    else:
+        mean_time_to_ruin = np.nan
+
+    # Percentiles of the (unabsorbed) surplus at the end of each year
+    surplus_percentiles = np.percentile(surplus, percentiles, axis=0)
+
+    stats = {
+        'ruin_probability': ruined.mean(),
+        'ruin_probability_by_year': np.cumsum(ruin_time_pmf),
+        'ruin_time_pmf': ruin_time_pmf,
+        'mean_time_to_ruin': mean_time_to_ruin,
+        'surplus_percentiles': dict(zip(percentiles, surplus_percentiles)),
+        'mean_final_surplus': surplus[:, -1].mean(),
+        'initial_capital': initial_capital,
+        'premium_per_year': premium_per_year,
+        'num_paths': num_paths,
+        'num_years': num_years,
+        'seed': seed
+    }
+
+    return stats
+
+
+def law_of_large_numbers_curve(accident_probability=0.05, min_policyholders=10, max_policyholders=1000000,
+                               num_points=200, confidence=0.99, seed=42):
+    """
+    Computes the Actual/Expected loss ratio for every pool size in one cumulative pass
+
+    One nested sequence of pools is simulated: each larger pool contains the smaller ones,
+    so claim counts are the cumulative sum of binomial increments between grid sizes.
+    The confidence band is the analytic binomial envelope around 1.0.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident
+    min_policyholders : int
+        Smallest pool size on the curve
+    max_policyholders : int
+        Largest pool size on the curve
+    num_points : int
+        Number of (log-spaced) pool sizes on the curve
+    confidence : float
+        Confidence level of the band (0.99 = 99%)
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+
+    Returns:
+    --------
+    stats : dict
+        Pool sizes, Actual/Expected ratios and the band limits
+    """
+    rng = make_generator(seed)
+    p = accident_probability
+
+    # Log-spaced, strictly increasing pool sizes
+    pool_sizes = np.unique(np.geomspace(min_policyholders, max_policyholders, num_points).astype(np.int64))
+
+    # Claims among the policyholders added at each step, accumulated into pool totals
+    new_policyholders = np.diff(pool_sizes, prepend=0)
+    claim_counts = np.cumsum(rng.binomial(new_policyholders, p))
+
+    expected_claims = pool_sizes * p
+    actual_to_expected = claim_counts / expected_claims
+
+    # Normal approximation to the binomial: sd of the ratio is sqrt((1 - p) / (n * p))
+    z_score = NormalDist().inv_cdf(0.5 + confidence / 2)
+    band_half_width = z_score * np.sqrt((1 - p) / expected_claims)
+
+    stats = {
+        'pool_sizes': pool_sizes,
+        'claim_counts': claim_counts,
+        'actual_to_expected': actual_to_expected,
+        'band_lower': np.maximum(1 - band_half_width, 0),
+        'band_upper': 1 + band_half_width,
+        'confidence': confidence,
+        'seed': seed
+    }
+
+    return stats
+
+
+def demonstrate_law_of_large_numbers(accident_probability=0.05, num_policyholders=None, seed=42,
+                                     return_fig=False, is_mobile=False, max_policyholders=1000000):
+    """
+    Plots how the Actual/Expected ratio converges to 1.0 as the pool grows
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident
+    num_policyholders : int
+        Pool size to highlight on the curve (e.g. the current slider value)
+    seed : int or numpy.random.Generator
+        Random seed for reproducibility
+    return_fig : bool
+        If True, returns the figure and stats for Shiny integration
+    is_mobile : bool
+        Whether to use mobile-optimized visualization
+    max_policyholders : int
+        Largest pool size on the curve
+
+    Returns:
+    --------
+    fig : matplotlib.figure.Figure
+        The figure object (if return_fig is True)
+    stats : dict
+        Key statistics (if return_fig is True)
+    """
+    stats = law_of_large_numbers_curve(accident_probability, max_policyholders=max_policyholders, seed=seed)
+
+    pool_sizes = stats['pool_sizes']
+    ratios = stats['actual_to_expected']
+
+    if not return_fig:
+        step = max(len(pool_sizes) // 10, 1)
+        print("\nLaw of Large Numbers:")
+        for n, ratio in zip(pool_sizes[::step], ratios[::step]):
+            print(f"• {n:,} policyholders: Actual/Expected = {ratio:.3f}")
+        return
+
+    if is_mobile:
+        fig = Figure(figsize=(7, 9))
+        linewidth = 3
+        fontsize_title = 18
+        fontsize_labels = 16
+    else:
+        fig = Figure(figsize=(14, 5))
+        linewidth = 1.5
+        fontsize_title = 14
+        fontsize_labels = 12
+
+    ax = fig.add_subplot(111)
+
+    # Analytic band - where the ratio falls in the stated share of simulations
+    ax.fill_between(pool_sizes, stats['band_lower'], stats['band_upper'],
+                    color='#99CCFF', alpha=0.4,
+                    label=f"{stats['confidence']:.0%} band")
+
+    ax.plot(pool_sizes, ratios, color='#3498DB', linewidth=linewidth, label='Simulated pool')
+    ax.axhline(1.0, color='#2ECC71', linestyle='--', linewidth=linewidth, label='Expected (1.0)')
+
+    # Mark the pool size chosen on the slider
+    if num_policyholders is not None:
+        idx = min(np.searchsorted(pool_sizes, num_policyholders), len(pool_sizes) - 1)
+        ax.scatter(pool_sizes[idx], ratios[idx], color='#E74C3C', s=120 if is_mobile else 80, zorder=5,
+                   edgecolors='black', label=f'{num_policyholders:,} policyholders')
+
+    ax.set_xscale('log')
+    ax.set_ylim(0, max(2.0, min(stats['band_upper'].max(), ratios.max() * 1.1)))
+    ax.xaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: '{:,.0f}'.format(x)))
+
+    ax.set_xlabel('Number of Policyholders', fontsize=fontsize_labels, fontweight='bold' if is_mobile else 'normal')
+    ax.set_ylabel('Actual/Expected', fontsize=fontsize_labels, fontweight='bold' if is_mobile else 'normal')
+    ax.set_title('Law of Large Numbers: Actual/Expected vs Pool Size', fontsize=fontsize_title,
+                 fontweight='bold' if is_mobile else 'normal')
+    ax.grid(True, alpha=0.3)
+    ax.legend(loc='upper right', fontsize=fontsize_labels - 2)
+
+    fig.tight_layout()
+
+    return fig, stats
@@ -0,0 +1,132 @@
+import numpy as np
+
+
+def make_generator(seed=None):
+    """
+    Creates an isolated random number generator for one simulation call
+
+    Parameters:
+    -----------
+    seed : int, numpy.random.SeedSequence or numpy.random.Generator
+        Seed for the stream. An existing Generator is returned unchanged so
+        callers can thread one stream through several simulation steps.
+
+    Returns:
+    --------
+    numpy.random.Generator
+        Generator that does not share state with numpy's global RNG
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    return np.random.Generator(np.random.PCG64(seed))
+
+
+def seed_sequence(seed):
+    """
+    A fresh SeedSequence for seed, for spawning child seeds
+
+    SeedSequence.spawn advances the sequence's child counter, so a SeedSequence passed
+    in by the caller is copied rather than spawned from: repeated calls with the same
+    seed then get the same children.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+    return np.random.SeedSequence(seed)
+
+
+def spawn_generators(seed, num_streams):
+    """
+    Creates independent child generators from one seed
+
+    Parameters:
+    -----------
+    seed : int or numpy.random.SeedSequence
+        Parent seed for all streams
+    num_streams : int
+        Number of independent streams to create
+
+    Returns:
+    --------
+    list
+        List of numpy.random.Generator objects, one per stream
+    """
+    return [make_generator(child) for child in seed_sequence(seed).spawn(num_streams)]
+
+
+SAMPLING_METHODS = ('pseudo', 'sobol')
+
+
+def uniform_draws(rng, num_points, dimensions=1, sampling='pseudo'):
+    """
+    Draws points in the unit hypercube with pseudo-random or scrambled Sobol sampling
+
+    Sobol points fill the space more evenly than pseudo-random points, so averages
+    converge faster (close to 1/n instead of 1/sqrt(n) for smooth problems).
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream (also used to scramble the Sobol sequence)
+    num_points : int
+        Number of points
+    dimensions : int
+        Number of coordinates per point (one per random input, e.g. frequency and severity)
+    sampling : str
+        'pseudo' or 'sobol'
+
+    Returns:
+    --------
+    numpy.ndarray
+        Array of shape (num_points, dimensions) with values in [0, 1)
+    """
+    if sampling == 'pseudo':
+        return rng.random((num_points, dimensions))
+
+    if sampling != 'sobol':
+        raise ValueError(f"sampling must be one of {SAMPLING_METHODS}, got {sampling!r}")
+
+    # scipy.stats is slow to import, so only load it when Sobol sampling is requested
+    from scipy.stats import qmc
+
+    try:
+        sampler = qmc.Sobol(dimensions, scramble=True, rng=rng)
+    except TypeError:
+        # SciPy < 1.15 names the argument seed
+        sampler = qmc.Sobol(dimensions, scramble=True, seed=rng)
+
+    # Sobol balance properties hold for powers of two; use the first num_points of the next one
+    exponent = max(int(np.ceil(np.log2(max(num_points, 1)))), 0)
+    return sampler.random_base2(exponent)[:num_points]
+
+
+def normal_draws(rng, num_points, dimensions=1, sampling='pseudo'):
+    """
+    Draws standard normal points with pseudo-random or scrambled Sobol sampling
+
+    Parameters:
+    -----------
+    rng : numpy.random.Generator
+        Random stream
+    num_points : int
+        Number of points
+    dimensions : int
+        Number of coordinates per point
+    sampling : str
+        'pseudo' or 'sobol'
+
+    Returns:
+    --------
+    numpy.ndarray
+        Array of shape (num_points, dimensions)
+    """
+    if sampling == 'pseudo':
+        return rng.standard_normal((num_points, dimensions))
+
+    from scipy.special import ndtri
+
+    uniforms = uniform_draws(rng, num_points, dimensions, sampling)
+    return ndtri(np.clip(uniforms, 1e-16, 1 - 1e-16))
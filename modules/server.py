@@ -2,15 +2,24 @@ from shiny import reactive, render, ui
 import random
 import numpy as np
 import matplotlib.pyplot as plt
-from modules.risk_pooling import demonstrate_risk_pooling
+from modules.risk_pooling import demonstrate_risk_pooling, demonstrate_law_of_large_numbers
 from modules.driver_comparison import demonstrate_driver_comparison
-from modules.premium_calculation import demonstrate_premium_calculation
+from modules.premium_calculation import demonstrate_premium_calculation, premium_sensitivity, CAPITAL_LEVEL
+from modules.cohorts import make_cohort_table
+from modules.credibility import simulate_driver_experience, credibility_weighted_rates
+from modules.portfolio_loader import load_configured_portfolio, comparison_inputs
 from modules.ethics import grade_ethics_answers
 
 def create_server_function():
     """
     Creates and returns the server function for the Shiny app
     """
+    # Per-cohort aggregates from the configured policy / claims extracts or CSV ingestion checkpoint,
+    # loaded once per process
+    # (None keeps the simulated sliders-driven data)
+    portfolio = load_configured_portfolio()
+    portfolio_inputs = comparison_inputs(portfolio) if portfolio is not None else None
+
     def server(input, output, session):
         # Mobile detection reactive value
         is_mobile = reactive.Value(False)
@@ -36,6 +45,29 @@ def create_server_function():
             good_driver = get_good_driver()
             return "Kendrick" if good_driver == "drake" else "Drake"
 
+        # Cohort names used in the text and plots: the loaded cohorts, or the drivers' cohorts
+        @reactive.Calc
+        def cohort_names():
+            if portfolio_inputs is not None:
+                return portfolio_inputs['first_cohort'], portfolio_inputs['second_cohort']
+            return f"{get_good_driver().capitalize()} Cohort", f"{get_bad_driver_name()} Cohort"
+
+        # Loaded aggregates hold one period per cohort, so there is no experience to credibility-weight
+        @reactive.Effect
+        def _disable_credibility_for_portfolio():
+            if portfolio_inputs is not None:
+                ui.update_checkbox("use_credibility", value=False,
+                                   label="Credibility weighting unavailable: rates come from the loaded portfolio")
+
+        # The driver sliders have no effect on loaded cohorts, so their labels show the loaded values
+        @reactive.Effect
+        def _relabel_driver_sliders_for_portfolio():
+            if portfolio_inputs is not None:
+                ui.update_slider("base_frequency",
+                                 label=f"Accident Freq: {portfolio_inputs['base_frequency']:.1%} from the loaded portfolio")
+                ui.update_slider("base_severity",
+                                 label=f"Claim Amt: ${portfolio_inputs['base_severity']:,.0f} from the loaded portfolio")
+
         # Update offset values when re-simulate buttons are clicked
         @reactive.Effect
         @reactive.event(input.resim_risk)
@@ -55,6 +87,9 @@ def create_server_function():
         @output
         @render.text
         def bad_driver_freq_label():
+            if portfolio_inputs is not None:
+                return (f"Frequency Multiplier: {portfolio_inputs['bad_driver_freq_multiplier']:.2f}x "
+                        f"from the loaded portfolio")
             bad_driver = get_bad_driver_name()
             # Shorter text for mobile
             if is_mobile.get():
@@ -65,6 +100,9 @@ def create_server_function():
         @output
         @render.text
         def bad_driver_severity_label():
+            if portfolio_inputs is not None:
+                return (f"Claim Amount Multiplier: {portfolio_inputs['bad_driver_severity_multiplier']:.2f}x "
+                        f"from the loaded portfolio")
             bad_driver = get_bad_driver_name()
             # Shorter text for mobile
             if is_mobile.get():
@@ -76,14 +114,14 @@ def create_server_function():
         @output
         @render.ui
         def premium_bad_driver_label():
-            bad_driver = get_bad_driver_name()
-            return ui.strong(f"{bad_driver} Cohort:")
+            _, second_cohort = cohort_names()
+            return ui.strong(f"{second_cohort}:")
 
         @output
         @render.ui
         def premium_first_cohort_label():
-            good_driver = get_good_driver().capitalize()
-            return ui.strong(f"{good_driver} Cohort:")
+            first_cohort, _ = cohort_names()
+            return ui.strong(f"{first_cohort}:")
 
         # Reactive calculations for seed values
         @reactive.Calc
@@ -92,10 +130,21 @@ def create_server_function():
             offset = risk_sim_offset.get()
             return base_seed + offset, base_seed, offset
 
+        # Loaded cohort rates replace the slider values when extracts are configured
+        @reactive.Calc
+        def driver_inputs():
+            if portfolio_inputs is not None:
+                return (portfolio_inputs['base_frequency'], portfolio_inputs['base_severity'],
+                        portfolio_inputs['bad_driver_freq_multiplier'],
+                        portfolio_inputs['bad_driver_severity_multiplier'])
+            return (input.base_frequency(), input.base_severity(),
+                    input.freq_multiplier(), input.severity_multiplier())
+
         @reactive.Calc
         def driver_seed():
-            base_seed = int(input.base_frequency() * 10000 + input.base_severity() +
-                            input.freq_multiplier() * 100 + input.severity_multiplier() * 100)
+            base_frequency, base_severity, freq_multiplier, severity_multiplier = driver_inputs()
+            base_seed = int(base_frequency * 10000 + base_severity +
+                            freq_multiplier * 100 + severity_multiplier * 100)
             offset = driver_sim_offset.get()
             return base_seed + offset, base_seed, offset
 
@@ -139,6 +188,23 @@ def create_server_function():
             fig, _ = risk_data()
             return fig
 
+        @reactive.Calc
+        def risk_convergence_data():
+            seed, _, _ = risk_seed()
+            return demonstrate_law_of_large_numbers(
+                input.accident_probability(),
+                input.num_policyholders(),
+                seed=seed,
+                return_fig=True,
+                is_mobile=is_mobile.get()
+            )
+
+        @output
+        @render.plot
+        def risk_convergence_plot():
+            fig, _ = risk_convergence_data()
+            return fig
+
         @output
         @render.text
         def risk_pooling_interpretation():
@@ -186,15 +252,23 @@ def create_server_function():
             good_driver = get_good_driver()
             good_driver_image = f"{good_driver}.jpeg"
             print(f"Driver Comparison using seed: {seed} (base: {base}, offset: {offset}, good driver: {good_driver})")
+
+            # The loaded cohorts keep their own claim amount spread
+            portfolio_args = {}
+            if portfolio_inputs is not None:
+                portfolio_args = {
+                    'cohort_names': cohort_names(),
+                    'severity_sigmas': (portfolio_inputs['good_severity_sigma'],
+                                        portfolio_inputs['bad_severity_sigma'])
+                }
+
             return demonstrate_driver_comparison(
-                input.base_frequency(),
-                input.base_severity(),
-                input.freq_multiplier(),
-                input.severity_multiplier(),
+                *driver_inputs(),
                 seed=seed,
                 return_fig=True,
                 good_driver_image=good_driver_image,
-                is_mobile=is_mobile.get()  # Pass mobile flag
+                is_mobile=is_mobile.get(),  # Pass mobile flag
+                **portfolio_args
             )
 
         @output
@@ -207,12 +281,7 @@ def create_server_function():
         @render.text
         def driver_comparison_interpretation():
             _, stats = driver_data()
-            good_driver = get_good_driver().capitalize()
-            bad_driver = get_bad_driver_name()
-
-            # Use specific cohort names
-            first_cohort = f"{good_driver} Cohort"
-            second_cohort = f"{bad_driver} Cohort"
+            first_cohort, second_cohort = cohort_names()
 
             # Shorter interpretation for mobile
             if is_mobile.get():
@@ -245,48 +314,79 @@ def create_server_function():
 
                 return text
 
+        # Frequencies and severities used by the premium tab: the loaded extracts' cohort rates
+        # (credibility weighting is unavailable there), the driver comparison's estimates, or
+        # Buhlmann-Straub credibility-weighted cohort frequencies from 10 years of experience
+        @reactive.Calc
+        def premium_inputs():
+            if portfolio_inputs is not None:
+                return (portfolio_inputs['good_frequency'], portfolio_inputs['good_severity'],
+                        portfolio_inputs['bad_frequency'], portfolio_inputs['bad_severity'])
+
+            _, driver_stats = driver_data()
+            good_freq = driver_stats['good_avg_frequency']
+            bad_freq = driver_stats['bad_avg_frequency']
+
+            if input.use_credibility():
+                seed, _, _ = driver_seed()
+                num_drivers = 80 if is_mobile.get() else 200
+                cohorts = make_cohort_table(
+                    [driver_stats['first_cohort_name'], driver_stats['second_cohort_name']],
+                    [input.base_frequency(), input.base_frequency() * input.freq_multiplier()],
+                    [input.base_severity(), input.base_severity() * input.severity_multiplier()],
+                    [driver_stats['good_severity_sigma'], driver_stats['bad_severity_sigma']],
+                    num_drivers
+                )
+                rates = credibility_weighted_rates(simulate_driver_experience(cohorts, seed=seed))
+                good_freq, bad_freq = rates['cohort']['rate']
+
+            return good_freq, driver_stats['good_avg_severity'], bad_freq, driver_stats['bad_avg_severity']
+
         # Display premium calculation tab info about inherited values
         @output
         @render.text
         def premium_good_driver_info():
+            if portfolio_inputs is not None:
+                return portfolio_inputs['first_cohort']
             return f"{get_good_driver().capitalize()}"
 
         @output
         @render.text
         def premium_good_freq_info():
-            _, stats = driver_data()
-            return f"{stats['good_avg_frequency']:.1%}"
+            good_freq, _, _, _ = premium_inputs()
+            return f"{good_freq:.1%}"
 
         @output
         @render.text
         def premium_good_severity_info():
-            _, stats = driver_data()
-            return f"${stats['good_avg_severity']:,.0f}"
+            _, good_severity, _, _ = premium_inputs()
+            return f"${good_severity:,.0f}"
 
         @output
         @render.text
         def premium_bad_info():
-            _, stats = driver_data()
+            _, _, bad_freq, bad_severity = premium_inputs()
             # Simplified for mobile
             if is_mobile.get():
-                return f"{stats['bad_avg_frequency']:.1%}, ${stats['bad_avg_severity']:,.0f}"
+                return f"{bad_freq:.1%}, ${bad_severity:,.0f}"
             else:
-                return f"Freq: {stats['bad_avg_frequency']:.1%}, Severity: ${stats['bad_avg_severity']:,.0f}"
+                return f"Freq: {bad_freq:.1%}, Severity: ${bad_severity:,.0f}"
 
         # Premium Calculation Module - Now uses values from driver comparison
         @reactive.Calc
         def premium_calc_data():
-            # Get driver data from previous tab
-            _, driver_stats = driver_data()
-
             # Use the good and bad driver data from driver comparison
-            good_freq = driver_stats['good_avg_frequency']
-            good_severity = driver_stats['good_avg_severity']
-            bad_freq = driver_stats['bad_avg_frequency']
-            bad_severity = driver_stats['bad_avg_severity']
+            good_freq, good_severity, bad_freq, bad_severity = premium_inputs()
+            _, driver_stats = driver_data()
             good_driver = get_good_driver()
             good_driver_image = f"{good_driver}.jpeg"
 
+            # Capital uses the claim amount spread of the loaded cohorts, or of the simulated ones
+            if portfolio_inputs is not None:
+                severity_sigmas = portfolio_inputs['good_severity_sigma'], portfolio_inputs['bad_severity_sigma']
+            else:
+                severity_sigmas = driver_stats['good_severity_sigma'], driver_stats['bad_severity_sigma']
+
             # Pass values to premium calculation with mobile flag
             return demonstrate_premium_calculation(
                 accident_frequency=good_freq,
@@ -295,7 +395,11 @@ def create_server_function():
                 bad_driver_severity=bad_severity,
                 good_driver_image=good_driver_image,
                 return_fig=True,
-                is_mobile=is_mobile.get()  # Pass mobile flag
+                is_mobile=is_mobile.get(),  # Pass mobile flag
+                risk_margin_mode=input.risk_margin_mode(),
+                severity_sigma=severity_sigmas[0],
+                bad_driver_severity_sigma=severity_sigmas[1],
+                cohort_names=cohort_names() if portfolio_inputs is not None else None
             )
 
         @output
@@ -308,21 +412,19 @@ def create_server_function():
         @render.text
         def premium_calc_interpretation():
             _, stats = premium_calc_data()
-            _, driver_stats = driver_data()
-
-            good_freq = driver_stats['good_avg_frequency']
-            good_severity = driver_stats['good_avg_severity']
-            bad_freq = driver_stats['bad_avg_frequency']
-            bad_severity = driver_stats['bad_avg_severity']
-            good_driver = get_good_driver().capitalize()
-            bad_driver = get_bad_driver_name()
-
-            # Use specific cohort names
-            first_cohort = f"{good_driver} Cohort"
-            second_cohort = f"{bad_driver} Cohort"
-
-            expense_ratio = 0.25
-            risk_margin_ratio = 0.05
+            good_freq, good_severity, bad_freq, bad_severity = premium_inputs()
+            first_cohort, second_cohort = cohort_names()
+
+            expense_ratio = stats['expense_ratio']
+            risk_margin_ratio = stats['risk_margin_ratio']
+            risk_margin_ratio_bad = stats['risk_margin_ratio_bad']
+            cost_of_capital = stats['risk_margin_mode'] == 'cost_of_capital'
+            if cost_of_capital:
+                formula = "Premium = (Expected Loss + Risk Margin) / (1 - Expense Ratio)"
+                risk_margin_note = (f"Risk Margin = {stats['cost_of_capital_rate']:.0%} cost of capital on the "
+                                    f"{CAPITAL_LEVEL:.1%} VaR of {stats['cohort_size']:,} policies, per policy")
+            else:
+                formula = "Premium = Expected Loss / (1 - Expense Ratio - Risk Margin)"
 
             # Shorter interpretation for mobile
             if is_mobile.get():
@@ -342,7 +444,7 @@ def create_server_function():
                 premium_ratio = stats['premium_bad'] / stats['premium']
 
                 text += f"• Premium Difference: ${premium_diff:,.0f} ({premium_ratio:.1f}x)\n\n"
-                text += "• Key Formula: Premium = Expected Loss / (1 - Expense - Risk)"
+                text += f"• Key Formula: {formula}"
 
                 return text
             else:
@@ -353,7 +455,7 @@ def create_server_function():
                 text += f"  - Est. Average Claim Severity: ${good_severity:,.0f} (average cost when a claim occurs)\n"
                 text += f"  - Expected Loss: ${stats['expected_loss']:,.2f} (frequency × severity)\n"
                 text += f"  - Expenses: ${stats['expenses']:,.2f} ({expense_ratio:.0%} of premium)\n"
-                text += f"  - Risk Margin: ${stats['risk_margin']:,.2f} ({risk_margin_ratio:.0%} of premium)\n"
+                text += f"  - Risk Margin: ${stats['risk_margin']:,.2f} ({risk_margin_ratio:.1%} of premium)\n"
                 text += f"  - Final Premium: ${stats['premium']:,.2f}\n\n"
 
                 text += f"• {second_cohort}:\n"
@@ -361,7 +463,7 @@ def create_server_function():
                 text += f"  - Est. Average Claim Severity: ${bad_severity:,.0f} (average cost when a claim occurs)\n"
                 text += f"  - Expected Loss: ${stats['expected_loss_bad']:,.2f} (frequency × severity)\n"
                 text += f"  - Expenses: ${stats['expenses_bad']:,.2f} ({expense_ratio:.0%} of premium)\n"
-                text += f"  - Risk Margin: ${stats['risk_margin_bad']:,.2f} ({risk_margin_ratio:.0%} of premium)\n"
+                text += f"  - Risk Margin: ${stats['risk_margin_bad']:,.2f} ({risk_margin_ratio_bad:.1%} of premium)\n"
                 text += f"  - Final Premium: ${stats['premium_bad']:,.2f}\n\n"
 
                 premium_diff = stats['premium_bad'] - stats['premium']
@@ -369,8 +471,26 @@ def create_server_function():
 
                 text += f"• Premium Difference: ${premium_diff:,.2f} ({premium_ratio:.1f}x higher for {second_cohort})\n\n"
 
+                # What-if: premium change per step in each input, for both cohorts at once (the
+                # cost-of-capital margin is re-sized at each shifted point)
+                changes = premium_sensitivity([good_freq, bad_freq], [good_severity, bad_severity],
+                                              expense_ratio, [risk_margin_ratio, risk_margin_ratio_bad],
+                                              risk_margin_mode=stats['risk_margin_mode'],
+                                              severity_sigma=[stats['severity_sigma'], stats['severity_sigma_bad']],
+                                              num_policies=stats['cohort_size'],
+                                              cost_of_capital_rate=stats['cost_of_capital_rate'])
+                text += "• What-if (premium change):\n"
+                text += f"  - +1 pt accident frequency: +${changes['frequency'][0]:,.0f} ({first_cohort}), "
+                text += f"+${changes['frequency'][1]:,.0f} ({second_cohort})\n"
+                text += f"  - +$1,000 average claim: +${changes['severity'][0]:,.0f} ({first_cohort}), "
+                text += f"+${changes['severity'][1]:,.0f} ({second_cohort})\n"
+                text += f"  - +1 pt expense ratio: +${changes['expense_ratio'][0]:,.0f} ({first_cohort}), "
+                text += f"+${changes['expense_ratio'][1]:,.0f} ({second_cohort})\n\n"
+
                 text += "• Key Insights:\n"
-                text += f"  1. The premium calculation formula is: Premium = Expected Loss / (1 - Expense Ratio - Risk Margin)\n"
+                text += f"  1. The premium calculation formula is: {formula}\n"
+                if cost_of_capital:
+                    text += f"     ({risk_margin_note})\n"
                 text += f"  2. Both frequency and severity directly affect the premium - if either doubles, expected loss doubles\n"
                 text += f"  3. A driver cohort with {premium_ratio:.1f}x higher risk pays {premium_ratio:.1f}x higher premium\n"
                 text += f"  4. The expense and risk margin components are proportionally larger for higher-risk driver cohorts\n"
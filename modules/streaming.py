@@ -0,0 +1,229 @@
+import numpy as np
+from modules.cohorts import driver_cohort_table, simulate_cohorts, cohort_slice
+from modules.moments import chunk_summary, merge_summaries, summary_statistics, safe_ratio
+from modules.risk_pooling import CLAIM_AMOUNT
+from modules.sampling import make_generator, seed_sequence
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a fixed relative accuracy (log-spaced buckets)
+
+    Values are counted in buckets [gamma^(k-1), gamma^k) with gamma = (1 + a) / (1 - a),
+    so any reported quantile is within a relative error a of the true one. Two sketches
+    with the same accuracy merge by adding bucket counts. Zeros are counted separately.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = np.log(self.gamma)
+        self.zero_count = 0
+        self.buckets = {}
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, values):
+        """
+        Adds an array of non-negative values to the sketch
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+
+        keys, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64),
+                                 return_counts=True)
+        for key, count in zip(keys.tolist(), counts.tolist()):
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+        return self
+
+    def merge(self, other):
+        """
+        Adds the counts of another sketch with the same relative accuracy
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches with the same relative accuracy can be merged")
+
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+
+        return self
+
+    def quantile(self, q):
+        """
+        Returns the estimated q-quantile (0 <= q <= 1), or nan for an empty sketch
+        """
+        total = self.count
+        if total == 0:
+            return np.nan
+
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        keys = sorted(self.buckets)
+        cumulative = self.zero_count + np.cumsum([self.buckets[k] for k in keys])
+        key = keys[int(np.searchsorted(cumulative, rank, side='right'))]
+
+        # Bucket midpoint in the relative sense
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+
+def _chunk_seeds(seed):
+    """
+    Yields child seeds in the same order as SeedSequence(seed).spawn(n), one at a time
+    """
+    seed = seed_sequence(seed)
+
+    while True:
+        yield seed.spawn(1)[0]
+
+
+def stream_risk_pooling(accident_probability=0.05, num_policyholders=100, chunk_size=1000000, seed=42,
+                        quantiles=(0.5, 0.9, 0.99)):
+    """
+    Simulates a risk pool in fixed-size chunks of policyholders, yielding running results
+
+    Peak memory is bounded by chunk_size, so the pool size is only limited by time.
+    Chunks use the same child seeds as run_parallel_simulation with the same chunk size.
+
+    Parameters:
+    -----------
+    accident_probability : float
+        The probability of an accident
+    num_policyholders : int
+        The number of policyholders (None streams forever)
+    chunk_size : int
+        Policyholders simulated per chunk
+    seed : int or numpy.random.SeedSequence
+        Random seed for reproducibility
+    quantiles : tuple
+        Quantiles of individual losses to report from the sketch
+
+    Yields:
+    -------
+    stats : dict
+        Running statistics after each chunk, in the same shape as demonstrate_risk_pooling's
+        stats plus 'policyholders_processed', 'loss_moments', 'loss_quantiles' and 'complete'
+    """
+    summary = chunk_summary([])
+    sketch = QuantileSketch()
+    num_with_loss = 0
+    processed = 0
+
+    for child_seed in _chunk_seeds(seed):
+        if num_policyholders is not None and processed >= num_policyholders:
+            return
+
+        size = chunk_size if num_policyholders is None else min(chunk_size, num_policyholders - processed)
+        rng = make_generator(child_seed)
+
+        # Outcomes for this chunk of policyholders only
+        accidents = rng.random(size) < accident_probability
+        individual_costs = np.where(accidents, float(CLAIM_AMOUNT), 0.0)
+
+        num_with_loss += int(accidents.sum())
+        processed += size
+        summary = merge_summaries(summary, chunk_summary(individual_costs))
+        sketch.add(individual_costs)
+
+        total_losses = num_with_loss * CLAIM_AMOUNT
+        fair_premium = accident_probability * CLAIM_AMOUNT
+        pool_premium_total = fair_premium * processed
+
+        yield {
+            'num_with_loss': num_with_loss,
+            'percent_with_loss': num_with_loss / processed * 100,
+            'fair_premium': fair_premium,
+            'total_losses': total_losses,
+            'pool_premium_total': pool_premium_total,
+            'pool_performance': total_losses / pool_premium_total,
+            'policyholders_processed': processed,
+            'loss_moments': summary_statistics(summary),
+            'loss_quantiles': {q: sketch.quantile(q) for q in quantiles},
+            'complete': num_policyholders is not None and processed >= num_policyholders,
+            'seed': seed
+        }
+
+
+def stream_driver_comparison(base_frequency=0.05, base_severity=8000, bad_driver_freq_multiplier=3.0,
+                             bad_driver_severity_multiplier=2.0, num_drivers=1000000, chunk_size=500000,
+                             seed=42, quantiles=(0.5, 0.9, 0.99, 0.995)):
+    """
+    Simulates both driver cohorts in fixed-size chunks of drivers, yielding running results
+
+    Each driver gets a frequency (normal around the cohort mean, as in
+    demonstrate_driver_comparison), a Poisson number of claims and lognormal claim amounts.
+
+    Parameters:
+    -----------
+    base_frequency : float
+        Base accident frequency for first cohort
+    base_severity : float
+        Base accident severity for first cohort
+    bad_driver_freq_multiplier : float
+        How much more frequently second cohort has accidents
+    bad_driver_severity_multiplier : float
+        How much more severe second cohort's accidents are
+    num_drivers : int
+        Drivers per cohort (None streams forever)
+    chunk_size : int
+        Drivers per cohort simulated per chunk
+    seed : int or numpy.random.SeedSequence
+        Random seed for reproducibility
+    quantiles : tuple
+        Quantiles of annual loss per driver to report from the sketches
+
+    Yields:
+    -------
+    stats : dict
+        Running 'good_*' / 'bad_*' statistics after each chunk, plus 'drivers_processed'
+        and 'complete'
+    """
+    names = ('good', 'bad')
+    summaries = {c: chunk_summary([]) for c in names}
+    sketches = {c: QuantileSketch() for c in names}
+    claim_counts = {c: 0 for c in names}
+    claim_totals = {c: 0.0 for c in names}
+    processed = 0
+
+    for child_seed in _chunk_seeds(seed):
+        if num_drivers is not None and processed >= num_drivers:
+            return
+
+        size = chunk_size if num_drivers is None else min(chunk_size, num_drivers - processed)
+        # Both cohorts of the chunk in one batched draw
+        table = driver_cohort_table(base_frequency, base_severity, bad_driver_freq_multiplier,
+                                    bad_driver_severity_multiplier, size, names)
+        results = simulate_cohorts(table, make_generator(child_seed), claim_level=True)
+
+        for index, cohort in enumerate(names):
+            losses = cohort_slice(table, results, index, 'driver_losses')
+
+            claim_counts[cohort] += results['num_claims'][index]
+            claim_totals[cohort] += results['actual_losses'][index]
+            summaries[cohort] = merge_summaries(summaries[cohort], chunk_summary(losses))
+            sketches[cohort].add(losses)
+
+        processed += size
+
+        stats = {'drivers_processed': processed,
+                 'complete': num_drivers is not None and processed >= num_drivers,
+                 'seed': seed}
+        for cohort in names:
+            moments = summary_statistics(summaries[cohort])
+            stats[f'{cohort}_avg_frequency'] = claim_counts[cohort] / processed
+            stats[f'{cohort}_avg_severity'] = claim_totals[cohort] / max(claim_counts[cohort], 1)
+            stats[f'{cohort}_total_losses'] = claim_totals[cohort]
+            stats[f'{cohort}_loss_moments'] = moments
+            stats[f'{cohort}_loss_quantiles'] = {q: sketches[cohort].quantile(q) for q in quantiles}
+
+        stats['loss_multiplier'] = safe_ratio(stats['bad_total_losses'], stats['good_total_losses'])
+        stats['freq_multiplier'] = safe_ratio(stats['bad_avg_frequency'], stats['good_avg_frequency'])
+        stats['severity_multiplier'] = safe_ratio(stats['bad_avg_severity'], stats['good_avg_severity'])
+
+        yield stats
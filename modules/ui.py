@@ -1,4 +1,5 @@
 from shiny import ui
+from modules.premium_calculation import RISK_MARGIN_RATIO, COST_OF_CAPITAL_RATE, CAPITAL_LEVEL
 
 def create_app_ui():
     """
@@ -79,6 +80,15 @@ def create_app_ui():
                               ),
                        ui.div({"class": "interpretation-box mobile-interpretation"},
                               ui.tags.pre(ui.output_text("risk_pooling_interpretation"))
+                              ),
+                       ui.div({"class": "plot-container"},
+                              ui.div({"class": "plot-title"}, "Law of Large Numbers"),
+                              ui.div(
+                                  {"style": "overflow-x: auto; -webkit-overflow-scrolling: touch; position: relative;"},
+                                  ui.output_plot("risk_convergence_plot",
+                                                 width="100%",
+                                                 height="600px")  # Fixed pixel height
+                              )
                               )
                        ),
 
@@ -178,6 +188,28 @@ def create_app_ui():
                                             )
                                      )
                         ),
+                        # Option to price with credibility-weighted cohort frequencies
+                        ui.row(
+                            ui.column(12,
+                                     ui.div({"style": "text-align: center;"},
+                                            ui.input_checkbox("use_credibility",
+                                                              "Use credibility-weighted frequencies (10 years of experience)",
+                                                              value=False)
+                                            )
+                                     )
+                        ),
+                        # Risk margin as a flat share of premium or from the cohort's capital needs
+                        ui.row(
+                            ui.column(12,
+                                     ui.div({"style": "text-align: center;"},
+                                            ui.input_radio_buttons("risk_margin_mode", "Risk margin:",
+                                                                   {"ratio": f"{RISK_MARGIN_RATIO:.0%} of premium",
+                                                                    "cost_of_capital": f"Cost of capital ({COST_OF_CAPITAL_RATE:.0%} on "
+                                                                                       f"{CAPITAL_LEVEL:.1%} VaR - mean)"},
+                                                                   selected="ratio", inline=True)
+                                            )
+                                     )
+                        ),
                         # Information about the inherited values - simplified for mobile
                         ui.row(
                             ui.column(6,